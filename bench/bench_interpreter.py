@@ -0,0 +1,69 @@
+"""
+Interpreter throughput, in IR instructions per second.
+
+Run from the root directory:
+python3 -m bench.bench_interpreter [loop iterations]
+"""
+import sys
+import time
+
+from src.parser import Parser
+from src.interpreter import Interpreter
+
+TEXT = """
+function collatz_steps(n:int) -> int {
+entry:
+  steps:int = $copy 0
+  $jump head
+head:
+  done:int = $cmp lte n:int 1
+  $branch done:int exit body
+body:
+  half:int = $arith div n:int 2
+  twice:int = $arith mul half:int 2
+  even:int = $cmp eq twice:int n:int
+  triple:int = $arith mul n:int 3
+  odd_next:int = $arith add triple:int 1
+  n:int = $select even:int half:int odd_next:int
+  steps:int = $arith add steps:int 1
+  $jump head
+exit:
+  $ret steps:int
+}
+
+function main(iterations:int) -> int {
+entry:
+  i:int = $copy 1
+  total:int = $copy 0
+  $jump head
+head:
+  c:int = $cmp lt i:int iterations:int
+  $branch c:int body exit
+body:
+  s:int = $call collatz_steps(i:int)
+  total:int = $arith add total:int s:int
+  i:int = $arith add i:int 1
+  $jump head
+exit:
+  $ret total:int
+}
+"""
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    program = Parser(TEXT).parse_program()
+    start = time.perf_counter()
+    interpreter = Interpreter(program)
+    compile_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = interpreter.run("main", iterations)
+    run_time = time.perf_counter() - start
+    print(f"compiled in {compile_time * 1000:.2f}ms, result {result}")
+    print(f"{interpreter.steps} instructions in {run_time:.3f}s "
+          f"({interpreter.steps / run_time / 1e6:.2f}M instructions/s)")
+
+
+if __name__ == "__main__":
+    main()
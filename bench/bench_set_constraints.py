@@ -0,0 +1,86 @@
+"""
+How SetConstraints parsing, output (as text, and to and from the binary
+format) and solving scale with the number of constraints, on systems from
+gen_set_constraints.
+
+Run from the root directory:
+python3 -m bench.bench_set_constraints [--sizes 1000 10000 100000 1000000] [--no-solve] [--memory]
+
+Generator knobs (see gen_set_constraints.generate) can be set with e.g.
+--max-depth 3 --proj-density 0.1 --cycle-density 0.2.
+"""
+import argparse
+import gc
+import io
+import os
+import time
+import tracemalloc
+
+from src.set_constraints import SetConstraints
+from bench.gen_set_constraints import generate
+
+
+def timed(f, *args):
+    start = time.perf_counter()
+    result = f(*args)
+    return result, time.perf_counter() - start
+
+
+def parse_memory(text):
+    # memory held by the parsed constraints (tracing slows parsing, so it's separate)
+    gc.collect()
+    tracemalloc.start()
+    set_constraints = SetConstraints.parse(text)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del set_constraints
+    return current, peak
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    arg_parser.add_argument("--no-solve", action="store_true", help="skip solving")
+    arg_parser.add_argument("--memory", action="store_true", help="also measure memory (slow)")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--variables-per-constraint", type=float, default=0.5)
+    arg_parser.add_argument("--constructors", type=int, default=8)
+    arg_parser.add_argument("--max-arity", type=int, default=3)
+    arg_parser.add_argument("--contravariant-density", type=float, default=0.2)
+    arg_parser.add_argument("--max-depth", type=int, default=2)
+    arg_parser.add_argument("--proj-density", type=float, default=0.05)
+    arg_parser.add_argument("--cycle-density", type=float, default=0.05)
+    args = arg_parser.parse_args()
+
+    header = (f"{'constraints':>12} {'gen (s)':>9} {'parse (s)':>10} {'to_text (s)':>12} {'write_text (s)':>15}"
+              f" {'binary (MB)':>12} {'write_binary (s)':>17} {'read_binary (s)':>16} {'solve (s)':>10}")
+    if args.memory:
+        header += f" {'held (MB)':>10} {'peak (MB)':>10}"
+    print(header)
+    for size in args.sizes:
+        text, gen_time = timed(generate, size, max(int(size * args.variables_per_constraint), 1),
+                               args.constructors, args.max_arity, args.contravariant_density,
+                               args.max_depth, args.proj_density, args.cycle_density, args.seed)
+        set_constraints, parse_time = timed(SetConstraints.parse, text)
+        _, text_time = timed(set_constraints.to_text)
+        with open(os.devnull, "w") as devnull:
+            _, write_text_time = timed(set_constraints.write_text, devnull)
+        binary = io.BytesIO()
+        _, write_binary_time = timed(set_constraints.write_binary, binary)
+        binary.seek(0)
+        _, read_binary_time = timed(SetConstraints.read_binary, binary)
+        solve_time = float("nan")
+        if not args.no_solve:
+            _, solve_time = timed(set_constraints.solve)
+        row = (f"{size:>12} {gen_time:>9.3f} {parse_time:>10.3f} {text_time:>12.3f} {write_text_time:>15.3f}"
+               f" {len(binary.getvalue()) / 2 ** 20:>12.1f} {write_binary_time:>17.3f} {read_binary_time:>16.3f}"
+               f" {solve_time:>10.3f}")
+        del set_constraints
+        if args.memory:
+            current, peak = parse_memory(text)
+            row += f" {current / 2 ** 20:>10.1f} {peak / 2 ** 20:>10.1f}"
+        print(row, flush=True)
+
+
+if __name__ == "__main__":
+    main()
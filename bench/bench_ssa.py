@@ -0,0 +1,70 @@
+"""
+Sparse (SSA) vs dense constant propagation on a large synthetic function.
+
+Run from the root directory:
+python3 -m bench.bench_ssa [number of diamonds] [number of variables]
+"""
+import random
+import sys
+import time
+
+from src.parser import Parser
+from src.ssa import construct_ssa, destruct_ssa
+from src.constprop import dense_constant_propagation, sparse_constant_propagation
+
+
+def generate_function(num_diamonds, num_vars, seed=0):
+    # a chain of if/else diamonds, each arm updating a few of the variables
+    rng = random.Random(seed)
+    lines = ["function big(p:int) -> int {", "entry:"]
+    for v in range(num_vars):
+        lines.append(f"  v{v}:int = $copy {rng.randint(0, 9)}")
+    lines.append("  $jump d0")
+    for d in range(num_diamonds):
+        lines.append(f"d{d}:")
+        lines.append(f"  c{d}:int = $cmp lt p:int {d}")
+        lines.append(f"  $branch c{d}:int d{d}.t d{d}.f")
+        for arm in "tf":
+            lines.append(f"d{d}.{arm}:")
+            for _ in range(3):
+                lhs, a, b = rng.randrange(num_vars), rng.randrange(num_vars), rng.randrange(num_vars)
+                op = rng.choice(["add", "sub", "mul"])
+                lines.append(f"  v{lhs}:int = $arith {op} v{a}:int v{b}:int")
+            if rng.random() < 0.5:
+                lines.append(f"  v{rng.randrange(num_vars)}:int = $copy {rng.randint(0, 9)}")
+            lines.append(f"  $jump d{d + 1}")
+    lines.append(f"d{num_diamonds}:")
+    lines.append("  $ret v0:int")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def timed(f, *args):
+    start = time.perf_counter()
+    result = f(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    num_diamonds = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    num_vars = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    text = generate_function(num_diamonds, num_vars)
+    program, parse_time = timed(Parser(text).parse_program)
+    func = program.get_function("big")
+    print(f"{len(func.basic_blocks)} blocks, {num_vars} variables (parsed in {parse_time:.3f}s)")
+
+    _, dense_time = timed(dense_constant_propagation, func)
+    print(f"dense constant propagation:  {dense_time:.3f}s")
+
+    _, ssa_time = timed(construct_ssa, func)
+    _, sparse_time = timed(sparse_constant_propagation, func)
+    print(f"ssa construction:            {ssa_time:.3f}s")
+    print(f"sparse constant propagation: {sparse_time:.3f}s")
+    print(f"sparse + construction:       {ssa_time + sparse_time:.3f}s")
+
+    _, out_time = timed(destruct_ssa, func)
+    print(f"out of ssa:                  {out_time:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
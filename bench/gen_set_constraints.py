@@ -0,0 +1,85 @@
+"""
+Seeded generator of synthetic set constraint systems, in the text format read
+by SetConstraints.parse.
+
+Run from the root directory to print one:
+python3 -m bench.gen_set_constraints [number of constraints] [seed]
+"""
+import random
+import sys
+
+
+def generate(num_constraints, num_variables=None, num_constructors=8, max_arity=3,
+             contravariant_density=0.2, max_depth=2, proj_density=0.05, cycle_density=0.05, seed=0):
+    """
+    num_variables          set variables to use (default: num_constraints // 2)
+    num_constructors       constructors, each with a random arity 0..max_arity
+    contravariant_density  chance of each constructor position being contravariant
+    max_depth              deepest nesting of calls in a term
+    proj_density           chance of each side of a constraint being a proj(...)
+    cycle_density          chance of a variable-to-variable constraint going
+                           "backwards" (from a later variable to an earlier one),
+                           which is what creates cycles
+    Other variable-to-variable constraints only go forwards.
+    """
+    rng = random.Random(seed)
+    if num_variables is None:
+        num_variables = max(num_constraints // 2, 1)
+
+    lines = []
+    constructors = []
+    for i in range(num_constructors):
+        arity = rng.randint(0, max_arity)
+        contravariant = [p for p in range(arity) if rng.random() < contravariant_density]
+        constructors.append((f"c{i}", arity))
+        lines.append(f"def constructor c{i}, arity {arity}, contravariant positions "
+                     f"{' '.join(map(str, contravariant))}".strip())
+    with_args = [c for c in constructors if c[1] > 0]
+
+    def var():
+        return f"v{rng.randrange(num_variables)}"
+
+    def term(depth):
+        if depth == 0 or rng.random() < 0.5:
+            return var()
+        name, arity = rng.choice(constructors)
+        if arity == 0:
+            return f"call({name})"
+        return f"call({name}, {', '.join(term(depth - 1) for _ in range(arity))})"
+
+    def call(depth):
+        name, arity = rng.choice(constructors)
+        if arity == 0:
+            return f"call({name})"
+        return f"call({name}, {', '.join(term(depth - 1) for _ in range(arity))})"
+
+    def proj():
+        name, arity = rng.choice(with_args)
+        return f"proj({name}, {var()}, {rng.randrange(arity)})"
+
+    for _ in range(num_constraints):
+        if with_args and rng.random() < proj_density:
+            if rng.random() < 0.5:
+                lines.append(f"{proj()} <= {var()}")
+            else:
+                lines.append(f"{call(max_depth)} <= {proj()}")
+            continue
+        kind = rng.random()
+        if kind < 0.4:
+            # source: a call flowing into a variable
+            lines.append(f"{call(max_depth)} <= {var()}")
+        elif kind < 0.8:
+            a, b = sorted(rng.sample(range(num_variables), 2)) if num_variables > 1 else (0, 0)
+            if rng.random() < cycle_density:
+                a, b = b, a
+            lines.append(f"v{a} <= v{b}")
+        else:
+            # sink: a variable flowing into a call
+            lines.append(f"{var()} <= {call(max_depth)}")
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    num_constraints = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    print(generate(num_constraints, seed=seed), end="")
@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+import sys
+from array import array
+
+# Fixed-width little endian ints, for the binary file formats (see
+# SetConstraints.write_binary and results.py), whatever the host byte order.
+
+
+def to_little_endian(values: array) -> bytes:
+    # the values as little endian bytes, leaving the array alone
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def from_little_endian(typecode: str, data) -> array:
+    # an array of the little endian values in data (bytes or a buffer slice)
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from .ir import *
+
+
+def successors(block: BasicBlock) -> List[BasicBlock]:
+    # targets() may contain None if a label didn't resolve, and a branch may
+    # name the same block twice
+    succs = []
+    for target in block.terminal.targets():
+        if target is not None and target not in succs:
+            succs.append(target)
+    return succs
+
+
+def address_taken_variables(func: Function) -> Set[str]:
+    # variables that are $addrof targets, so may change through any store or call
+    return {inst.target.variable.name for block in func.basic_blocks.values() for inst in block.body
+            if isinstance(inst, AddrofInst) and isinstance(inst.target, VarOperand)}
+
+
+def reverse_postorder(func: Function) -> List[BasicBlock]:
+    # blocks reachable from the entry, in reverse postorder
+    if func.entry is None:
+        return []
+    order = []
+    visited = {func.entry.label}
+    stack = [(func.entry, iter(successors(func.entry)))]
+    while stack:
+        block, succs = stack[-1]
+        for succ in succs:
+            if succ.label not in visited:
+                visited.add(succ.label)
+                stack.append((succ, iter(successors(succ))))
+                break
+        else:
+            stack.pop()
+            order.append(block)
+    order.reverse()
+    return order
+
+
+def predecessors(func: Function, blocks: List[BasicBlock] = None) -> Dict[str, List[BasicBlock]]:
+    # block label -> predecessor blocks, only counting edges out of `blocks`
+    # (all blocks by default)
+    if blocks is None:
+        blocks = list(func.basic_blocks.values())
+    preds = {label: [] for label in func.basic_blocks}
+    for block in blocks:
+        for succ in successors(block):
+            preds[succ.label].append(block)
+    return preds
+
+
+class DominatorTree:
+    """
+    Dominators of the blocks reachable from the entry, computed with
+    Cooper, Harvey & Kennedy's "A Simple, Fast Dominance Algorithm".
+    """
+    function: Function
+    order: List[BasicBlock]
+    preds: Dict[str, List[BasicBlock]]
+    idom: Dict[str, BasicBlock]
+    children: Dict[str, List[BasicBlock]]
+
+    def __init__(self, func: Function):
+        self.function = func
+        self.order = reverse_postorder(func)
+        self.preds = predecessors(func, self.order)
+        number = {block.label: i for i, block in enumerate(self.order)}
+
+        idom = {}
+        if self.order:
+            entry = self.order[0]
+            idom[entry.label] = entry
+        changed = True
+        while changed:
+            changed = False
+            for block in self.order[1:]:
+                new_idom = None
+                for pred in self.preds[block.label]:
+                    if pred.label not in idom:
+                        continue
+                    if new_idom is None:
+                        new_idom = pred
+                        continue
+                    # intersect
+                    a, b = pred, new_idom
+                    while a is not b:
+                        while number[a.label] > number[b.label]:
+                            a = idom[a.label]
+                        while number[b.label] > number[a.label]:
+                            b = idom[b.label]
+                    new_idom = a
+                if idom.get(block.label) is not new_idom:
+                    idom[block.label] = new_idom
+                    changed = True
+        self.idom = idom
+
+        self.children = {block.label: [] for block in self.order}
+        for block in self.order[1:]:
+            self.children[idom[block.label].label].append(block)
+
+    def is_reachable(self, block: BasicBlock) -> bool:
+        return block.label in self.idom
+
+    def dominates(self, a: BasicBlock, b: BasicBlock) -> bool:
+        if not self.is_reachable(b):
+            return False
+        while True:
+            if b is a:
+                return True
+            parent = self.idom[b.label]
+            if parent is b:
+                return False
+            b = parent
+
+    def frontiers(self) -> Dict[str, List[BasicBlock]]:
+        # dominance frontier of every reachable block
+        frontier = {block.label: [] for block in self.order}
+        for block in self.order:
+            preds = self.preds[block.label]
+            if len(preds) < 2:
+                continue
+            for pred in preds:
+                runner = pred
+                while runner is not self.idom[block.label]:
+                    if block not in frontier[runner.label]:
+                        frontier[runner.label].append(block)
+                    runner = self.idom[runner.label]
+        return frontier
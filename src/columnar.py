@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import bisect
+import copy
+from array import array
+from collections import Counter
+
+from .ir import *
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# A flat, array-backed lowering of a Function for analysis hot loops.
+#
+# Instruction i of the function (blocks in order, instructions in order) is
+# row i of the parallel columns:
+#   opcode[i]    index into OPCODES
+#   lhs[i]       variable ID defined, or NONE
+#   aux1/aux2[i] Arith/Cmp: operation index into AOPS/ROPS
+#                Gep: string ID of the field name (NONE if there isn't one)
+#                Call: string ID of the callee
+#                Jump: target block ID; Branch: true and false block IDs
+# Operands (including call args and phi ops) live in one side table in CSR
+# form: the operands of row i are operands[operand_start[i]:operand_start[i + 1]].
+# An operand ID >= 0 is a variable ID, a negative one is constant -1 - ID.
+# Block b is rows block_start[b]:block_start[b + 1].
+
+NONE = -1
+
+OPCODES = [ArithInst, CmpInst, PhiInst, CopyInst, AllocInst, AddrofInst, LoadInst, StoreInst, GepInst,
+           SelectInst, CallInst, ICallInst, RetInst, JumpInst, BranchInst]
+OPCODE = {cls: i for i, cls in enumerate(OPCODES)}
+AOPS = list(Aop)
+ROPS = list(Rop)
+
+
+class ColumnarFunction:
+    name: str
+    return_type: Type
+    parameters: List[int]
+    variables: List[Variable]
+    constants: List[Operand]
+    strings: List[str]
+    block_labels: List[str]
+    block_start: array
+    opcode: array
+    lhs: array
+    aux1: array
+    aux2: array
+    operand_start: array
+    operands: array
+    # row -> incoming block IDs, for phis that have them
+    phi_incoming: Dict[int, List[int]]
+    # row -> (struct, field index, field type), for geps with a resolved field
+    gep_fields: Dict[int, Tuple[Optional[Struct], Optional[int], Optional[Type]]]
+    address_taken: bool
+
+    def __init__(self, name, return_type):
+        self.name = name
+        self.return_type = return_type
+        self.parameters = []
+        self.variables = []
+        self.variable_ids = {}
+        self.constants = []
+        self.constant_ids = {}
+        self.strings = []
+        self.string_ids = {}
+        self.block_labels = []
+        self.block_start = array("i", [0])
+        self.opcode = array("B")
+        self.lhs = array("i")
+        self.aux1 = array("i")
+        self.aux2 = array("i")
+        self.operand_start = array("i", [0])
+        self.operands = array("i")
+        self.phi_incoming = {}
+        self.gep_fields = {}
+        self.address_taken = False
+
+    def __len__(self):
+        return len(self.opcode)
+
+    def __repr__(self):
+        return f"<ColumnarFunction {self.name}>"
+
+    def variable_id(self, variable: Variable) -> int:
+        var_id = self.variable_ids.get(variable.name)
+        if var_id is None:
+            var_id = self.variable_ids[variable.name] = len(self.variables)
+            self.variables.append(Variable(variable.name, variable.type))
+        return var_id
+
+    def operand_id(self, op: Operand) -> int:
+        if isinstance(op, VarOperand):
+            return self.variable_id(op.variable)
+        key = op.output()
+        const_id = self.constant_ids.get(key)
+        if const_id is None:
+            const_id = self.constant_ids[key] = len(self.constants)
+            self.constants.append(op)
+        return -1 - const_id
+
+    def string_id(self, s: str) -> int:
+        string_id = self.string_ids.get(s)
+        if string_id is None:
+            string_id = self.string_ids[s] = len(self.strings)
+            self.strings.append(s)
+        return string_id
+
+    def block_of(self, row: int) -> int:
+        return bisect.bisect_right(self.block_start, row) - 1
+
+    def program_point(self, row: int) -> str:
+        block = self.block_of(row)
+        return f"{self.name}.{self.block_labels[block]}.{row - self.block_start[block]}"
+
+    def row_operands(self, row: int) -> array:
+        return self.operands[self.operand_start[row]:self.operand_start[row + 1]]
+
+    @staticmethod
+    def from_function(func: Function) -> ColumnarFunction:
+        columnar = ColumnarFunction(func.name, func.return_type)
+        columnar.address_taken = func.address_taken
+        for param in func.parameters:
+            columnar.parameters.append(columnar.variable_id(param))
+        block_ids = {label: i for i, label in enumerate(func.basic_blocks)}
+
+        def block_id(inst, label):
+            if label not in block_ids:
+                raise ValueError(f"{inst.program_point} targets unknown label {label}")
+            return block_ids[label]
+
+        for label, block in func.basic_blocks.items():
+            columnar.block_labels.append(label)
+            for inst in block.body:
+                aux1 = aux2 = NONE
+                if isinstance(inst, ArithInst):
+                    aux1 = AOPS.index(inst.operation)
+                elif isinstance(inst, CmpInst):
+                    aux1 = ROPS.index(inst.operation)
+                elif isinstance(inst, GepInst):
+                    if inst.field_name:
+                        aux1 = columnar.string_id(inst.field_name)
+                    if inst.struct is not None or inst.field_index is not None:
+                        columnar.gep_fields[len(columnar.opcode)] = (inst.struct, inst.field_index, inst.field_type)
+                elif isinstance(inst, CallInst):
+                    aux1 = columnar.string_id(inst.callee)
+                elif isinstance(inst, JumpInst):
+                    aux1 = block_id(inst, inst.label)
+                elif isinstance(inst, BranchInst):
+                    aux1 = block_id(inst, inst.label_true)
+                    aux2 = block_id(inst, inst.label_false)
+                elif isinstance(inst, PhiInst) and inst.incoming is not None:
+                    columnar.phi_incoming[len(columnar.opcode)] = [block_ids[b.label] for b in inst.incoming]
+
+                lhs = getattr(inst, "lhs", None)
+                columnar.opcode.append(OPCODE[type(inst)])
+                columnar.lhs.append(NONE if lhs is None else columnar.variable_id(lhs))
+                columnar.aux1.append(aux1)
+                columnar.aux2.append(aux2)
+                columnar.operands.extend(columnar.operand_id(op) for op in inst.operands())
+                columnar.operand_start.append(len(columnar.operands))
+            columnar.block_start.append(len(columnar.opcode))
+        return columnar
+
+    def to_function(self) -> Function:
+        def operand(op_id):
+            if op_id >= 0:
+                return VarOperand(self.variable(op_id))
+            return self.constant(-1 - op_id)
+
+        blocks = []
+        for b, label in enumerate(self.block_labels):
+            body = []
+            for row in range(self.block_start[b], self.block_start[b + 1]):
+                cls = OPCODES[self.opcode[row]]
+                ops = [operand(op_id) for op_id in self.row_operands(row)]
+                lhs = self.variable(self.lhs[row]) if self.lhs[row] != NONE else None
+                aux1, aux2 = self.aux1[row], self.aux2[row]
+                if cls is ArithInst:
+                    inst = ArithInst(lhs, ops[0], ops[1], AOPS[aux1])
+                elif cls is CmpInst:
+                    inst = CmpInst(lhs, ops[0], ops[1], ROPS[aux1])
+                elif cls is PhiInst:
+                    inst = PhiInst(lhs, ops)
+                elif cls is CopyInst:
+                    inst = CopyInst(lhs, ops[0])
+                elif cls is AllocInst:
+                    inst = AllocInst(lhs)
+                elif cls is AddrofInst:
+                    inst = AddrofInst(lhs, ops[0])
+                elif cls is LoadInst:
+                    inst = LoadInst(lhs, ops[0])
+                elif cls is StoreInst:
+                    inst = StoreInst(ops[0], ops[1])
+                elif cls is GepInst:
+                    inst = GepInst(lhs, ops[0], ops[1], self.strings[aux1] if aux1 != NONE else "")
+                    if row in self.gep_fields:
+                        inst.struct, inst.field_index, inst.field_type = self.gep_fields[row]
+                elif cls is SelectInst:
+                    inst = SelectInst(lhs, ops[0], ops[1], ops[2])
+                elif cls is CallInst:
+                    inst = CallInst(lhs, self.strings[aux1], ops)
+                elif cls is ICallInst:
+                    inst = ICallInst(lhs, ops[0], ops[1:])
+                elif cls is RetInst:
+                    inst = RetInst(ops[0])
+                elif cls is JumpInst:
+                    inst = JumpInst(self.block_labels[aux1])
+                else:
+                    inst = BranchInst(ops[0], self.block_labels[aux1], self.block_labels[aux2])
+                body.append(inst)
+            blocks.append(BasicBlock(label, body))
+
+        func = Function(self.name, self.return_type, [self.variable(v) for v in self.parameters], blocks)
+        func.address_taken = self.address_taken
+        for row, incoming in self.phi_incoming.items():
+            block = blocks[self.block_of(row)]
+            phi = block.body[row - self.block_start[self.block_of(row)]]
+            phi.incoming = [blocks[b] for b in incoming]
+        return func
+
+    def variable(self, var_id: int) -> Variable:
+        # a fresh Variable, the object IR doesn't share them between instructions
+        var = self.variables[var_id]
+        return Variable(var.name, var.type)
+
+    def constant(self, const_id: int) -> Operand:
+        # likewise a fresh copy of the constant operand
+        return copy.copy(self.constants[const_id])
+
+    def def_use_counts(self) -> Tuple[List[int], List[int]]:
+        # number of definitions and uses of every variable ID
+        if numpy is not None:
+            columns = self.as_numpy()
+            lhs, operands = columns["lhs"], columns["operands"]
+            return (numpy.bincount(lhs[lhs >= 0], minlength=len(self.variables)).tolist(),
+                    numpy.bincount(operands[operands >= 0], minlength=len(self.variables)).tolist())
+        defs = [0] * len(self.variables)
+        uses = [0] * len(self.variables)
+        for var_id, count in Counter(self.lhs).items():
+            if var_id != NONE:
+                defs[var_id] = count
+        for op_id, count in Counter(self.operands).items():
+            if op_id >= 0:
+                uses[op_id] = count
+        return defs, uses
+
+    def constant_operand_rows(self) -> List[int]:
+        # rows with at least one constant operand: one scan of the operands,
+        # mapping each constant back to its row through operand_start
+        if numpy is not None:
+            columns = self.as_numpy()
+            positions = numpy.flatnonzero(columns["operands"] < 0)
+            rows = numpy.searchsorted(columns["operand_start"], positions, side="right") - 1
+            return numpy.unique(rows).tolist()
+        rows = []
+        starts = self.operand_start
+        for position, op_id in enumerate(self.operands):
+            if op_id < 0:
+                row = bisect.bisect_right(starts, position) - 1
+                if not rows or rows[-1] != row:
+                    rows.append(row)
+        return rows
+
+    def rows_with_opcode(self, cls) -> List[int]:
+        code = OPCODE[cls]
+        if numpy is not None:
+            return numpy.flatnonzero(self.as_numpy()["opcode"] == code).tolist()
+        return [row for row, opcode in enumerate(self.opcode) if opcode == code]
+
+    def as_numpy(self) -> Dict[str, object]:
+        # zero-copy NumPy views of the columns, which the passes above use
+        # when NumPy is installed
+        if numpy is None:
+            raise ImportError("as_numpy needs NumPy")
+        columns = ["block_start", "opcode", "lhs", "aux1", "aux2", "operand_start", "operands"]
+        return {name: numpy.frombuffer(getattr(self, name), dtype=getattr(self, name).typecode)
+                for name in columns}
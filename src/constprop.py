@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import operator
+
+from .cfg import *
+
+# Constant propagation over the integer variables of a function, in two flavours:
+# a dense dataflow analysis over the normal IR and a sparse one over SSA form
+# (see ssa.construct_ssa). Values are TOP (no value yet), an int, or BOTTOM.
+# Variables whose address is taken can change through any store or call, so
+# they are always BOTTOM.
+
+TOP = "top"
+BOTTOM = "bottom"
+
+
+def meet(a, b):
+    if a == TOP:
+        return b
+    if b == TOP or a == b:
+        return a
+    return BOTTOM
+
+
+# The concrete semantics of $arith div and $cmp, shared with the interpreter
+# and the abstract domains.
+
+RELATIONS = {
+    Rop.EQ: operator.eq,
+    Rop.NEQ: operator.ne,
+    Rop.LT: operator.lt,
+    Rop.GT: operator.gt,
+    Rop.LTE: operator.le,
+    Rop.GTE: operator.ge,
+}
+
+
+def c_div(left: int, right: int) -> int:
+    # C division truncates towards zero (right must not be 0)
+    quotient = abs(left) // abs(right)
+    return quotient if (left < 0) == (right < 0) else -quotient
+
+
+def eval_aop(operation: Aop, left: int, right: int):
+    if operation == Aop.ADD:
+        return left + right
+    if operation == Aop.SUB:
+        return left - right
+    if operation == Aop.MUL:
+        return left * right
+    if right == 0:
+        return BOTTOM
+    return c_div(left, right)
+
+
+def eval_rop(operation: Rop, left: int, right: int) -> int:
+    return int(RELATIONS[operation](left, right))
+
+
+def transfer(inst: Instruction, value_of):
+    # value of inst.lhs, given a function giving the value of an operand
+    if isinstance(inst, CopyInst):
+        return value_of(inst.rhs)
+    if isinstance(inst, (ArithInst, CmpInst)):
+        left = value_of(inst.left_op)
+        right = value_of(inst.right_op)
+        if left == BOTTOM or right == BOTTOM:
+            return BOTTOM
+        if left == TOP or right == TOP:
+            return TOP
+        if isinstance(inst, ArithInst):
+            return eval_aop(inst.operation, left, right)
+        return eval_rop(inst.operation, left, right)
+    if isinstance(inst, SelectInst):
+        condition = value_of(inst.condition)
+        if condition == TOP:
+            return TOP
+        if condition == BOTTOM:
+            return meet(value_of(inst.true_op), value_of(inst.false_op))
+        return value_of(inst.true_op if condition else inst.false_op)
+    if isinstance(inst, PhiInst):
+        value = TOP
+        for op in inst.ops:
+            value = meet(value, value_of(op))
+        return value
+    return BOTTOM
+
+
+def dense_constant_propagation(func: Function) -> Dict[str, Dict[str, object]]:
+    """
+    Classic forward dataflow: for every reachable block, the value of each
+    variable on entry. Variables missing from a map are TOP.
+    """
+    order = reverse_postorder(func)
+    if not order:
+        return {}
+    preds = predecessors(func, order)
+    in_memory = address_taken_variables(func)
+    block_in = {block.label: {} for block in order}
+    block_out = {block.label: None for block in order}
+    for name in [param.name for param in func.parameters] + sorted(in_memory):
+        block_in[order[0].label][name] = BOTTOM
+
+    worklist = list(reversed(order))
+    pending = {block.label for block in order}
+    while worklist:
+        block = worklist.pop()
+        pending.discard(block.label)
+        if preds[block.label]:
+            state = dict(block_in[block.label]) if block is order[0] else {}
+            for pred in preds[block.label]:
+                out = block_out[pred.label]
+                if out is None:
+                    continue
+                for name, value in out.items():
+                    state[name] = meet(state.get(name, TOP), value)
+            block_in[block.label] = state
+        state = dict(block_in[block.label])
+
+        def value_of(op):
+            if isinstance(op, ConstIntOperand):
+                return op.value
+            if isinstance(op, VarOperand):
+                return BOTTOM if op.variable.name in in_memory else state.get(op.variable.name, TOP)
+            return BOTTOM
+
+        for inst in block.body:
+            lhs = getattr(inst, "lhs", None)
+            if lhs is not None:
+                state[lhs.name] = BOTTOM if lhs.name in in_memory else transfer(inst, value_of)
+
+        if state != block_out[block.label]:
+            block_out[block.label] = state
+            for succ in successors(block):
+                if succ.label not in pending:
+                    pending.add(succ.label)
+                    worklist.append(succ)
+    return block_in
+
+
+def sparse_constant_propagation(func: Function) -> Dict[str, object]:
+    """
+    Propagate along SSA def-use chains (Wegman & Zadeck's SSA propagation,
+    without the conditional part). `func` must be in SSA form. Returns the
+    value of every parameter and every variable defined in the function.
+    """
+    order = reverse_postorder(func)
+    definition = {}
+    users = {}
+    for block in order:
+        for inst in block.body:
+            lhs = getattr(inst, "lhs", None)
+            if lhs is None:
+                continue
+            definition[lhs.name] = inst
+            for op in inst.operands():
+                if isinstance(op, VarOperand):
+                    users.setdefault(op.variable.name, []).append(inst)
+
+    in_memory = address_taken_variables(func)
+    values = {param.name: BOTTOM for param in func.parameters}
+    values.update((name, BOTTOM) for name in in_memory)
+
+    def value_of(op):
+        if isinstance(op, ConstIntOperand):
+            return op.value
+        if isinstance(op, VarOperand):
+            return values.get(op.variable.name, TOP)
+        return BOTTOM
+
+    worklist = list(definition.values())
+    while worklist:
+        inst = worklist.pop()
+        name = inst.lhs.name
+        if name in in_memory:
+            continue
+        value = transfer(inst, value_of)
+        if value != values.get(name, TOP):
+            values[name] = value
+            worklist.extend(users.get(name, []))
+    for name in definition:
+        values.setdefault(name, TOP)
+    return values
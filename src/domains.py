@@ -0,0 +1,365 @@
+from __future__ import annotations
+
+import math
+
+from .constprop import RELATIONS, c_div
+from .ir import *
+
+# Small abstract domains for integer analyses (signedness, constants, intervals).
+#
+# Every domain is finite, and its elements are encoded as ints 0..size-1, so
+# abstract values are plain ints and every transfer function is precomputed
+# into a flat lookup table: the result of `a op b` is
+#   domain.arith[Aop.ADD][a * domain.size + b]
+# (likewise `cmp[rop]`, `join` and `meet`). The constant and interval domains
+# are made finite by only tracking values in a small window, and losing
+# precision soundly outside of it.
+#
+# BlockTransfer applies all of a basic block's arithmetic in one call.
+
+
+class Domain:
+    """
+    Base class: subclasses list their `elements` (any hashable values, the
+    first one is bottom) and define the concrete `do_arith`, `do_cmp`,
+    `do_join`, `do_meet` and `abstract` on them. The tables are built from
+    those once, when the domain is created.
+    """
+    elements: List[object]
+    size: int
+    bottom: int
+    top: int
+    arith: Dict[Aop, List[int]]
+    cmp: Dict[Rop, List[int]]
+    join: List[int]
+    meet: List[int]
+    leq: List[bool]
+
+    def __init__(self, elements, top):
+        self.elements = elements
+        self.size = len(elements)
+        self.index = {element: i for i, element in enumerate(elements)}
+        self.bottom = 0
+        self.top = self.index[top]
+
+        def table(f):
+            return [self.index[f(x, y)] for x in elements for y in elements]
+
+        def strict(f):
+            # bottom (no value yet) in, bottom out
+            bottom = elements[0]
+            return lambda x, y: bottom if x == bottom or y == bottom else f(x, y)
+
+        self.arith = {aop: table(strict(lambda x, y, aop=aop: self.do_arith(aop, x, y))) for aop in Aop}
+        self.cmp = {rop: table(strict(lambda x, y, rop=rop: self.do_cmp(rop, x, y))) for rop in Rop}
+        self.join = table(self.do_join)
+        self.meet = table(self.do_meet)
+        self.leq = [self.join[a * self.size + b] == b for a in range(self.size) for b in range(self.size)]
+
+    def __repr__(self):
+        return f"<{type(self).__name__}>"
+
+    def decode(self, value: int):
+        return self.elements[value]
+
+    def abstract(self, n: int) -> int:
+        raise NotImplementedError
+
+    def abstract_operand(self, op: Operand) -> int:
+        if isinstance(op, ConstIntOperand):
+            return self.abstract(op.value)
+        if isinstance(op, ConstNullPtrOperand):
+            return self.abstract(0)
+        return self.top
+
+    def do_arith(self, aop, x, y):
+        raise NotImplementedError
+
+    def do_cmp(self, rop, x, y):
+        raise NotImplementedError
+
+    def do_join(self, x, y):
+        raise NotImplementedError
+
+    def do_meet(self, x, y):
+        raise NotImplementedError
+
+
+class SignDomain(Domain):
+    """
+    Sets of signs, as a bitmask: NEG | ZERO | POS. 0 is bottom, 7 is top.
+    """
+    NEG = 1
+    ZERO = 2
+    POS = 4
+    # enough values of each sign to see every possible sign of a result
+    SAMPLES = {NEG: [-3, -2, -1], ZERO: [0], POS: [1, 2, 3]}
+
+    def __init__(self):
+        super().__init__(list(range(8)), 7)
+
+    def abstract(self, n):
+        return self.NEG if n < 0 else self.POS if n > 0 else self.ZERO
+
+    def samples(self, x):
+        return [n for sign, ns in self.SAMPLES.items() if x & sign for n in ns]
+
+    def do_arith(self, aop, x, y):
+        result = 0
+        for a in self.samples(x):
+            for b in self.samples(y):
+                if aop == Aop.ADD:
+                    result |= self.abstract(a + b)
+                elif aop == Aop.SUB:
+                    result |= self.abstract(a - b)
+                elif aop == Aop.MUL:
+                    result |= self.abstract(a * b)
+                elif b != 0:
+                    result |= self.abstract(c_div(a, b))
+        return result
+
+    def do_cmp(self, rop, x, y):
+        result = 0
+        for a in self.samples(x):
+            for b in self.samples(y):
+                result |= self.POS if RELATIONS[rop](a, b) else self.ZERO
+        return result
+
+    def do_join(self, x, y):
+        return x | y
+
+    def do_meet(self, x, y):
+        return x & y
+
+
+class ConstantDomain(Domain):
+    """
+    Bottom, the constants -window..window, and top (any other value).
+    """
+    BOTTOM = "bottom"
+    TOP = "top"
+
+    def __init__(self, window=16):
+        self.window = window
+        super().__init__([self.BOTTOM] + list(range(-window, window + 1)) + [self.TOP], self.TOP)
+
+    def abstract(self, n):
+        if -self.window <= n <= self.window:
+            return self.index[n]
+        return self.top
+
+    def constant(self, n):
+        return n if -self.window <= n <= self.window else self.TOP
+
+    def do_arith(self, aop, x, y):
+        if aop == Aop.DIV and y == 0:
+            return self.BOTTOM
+        if aop == Aop.MUL and (x == 0 or y == 0):
+            return 0
+        if x == self.TOP or y == self.TOP:
+            return self.TOP
+        if aop == Aop.ADD:
+            return self.constant(x + y)
+        if aop == Aop.SUB:
+            return self.constant(x - y)
+        if aop == Aop.MUL:
+            return self.constant(x * y)
+        return self.constant(c_div(x, y))
+
+    def do_cmp(self, rop, x, y):
+        if x == self.TOP or y == self.TOP:
+            return self.TOP
+        return int(RELATIONS[rop](x, y))
+
+    def do_join(self, x, y):
+        if x == self.BOTTOM:
+            return y
+        if y == self.BOTTOM or x == y:
+            return x
+        return self.TOP
+
+    def do_meet(self, x, y):
+        if x == self.TOP:
+            return y
+        if y == self.TOP or x == y:
+            return x
+        return self.BOTTOM
+
+
+class IntervalDomain(Domain):
+    """
+    Bottom and intervals (lo, hi) whose bounds are -inf, -bound..bound or inf.
+    Results are widened outwards to the nearest representable bounds.
+    """
+    BOTTOM = "bottom"
+
+    def __init__(self, bound=4):
+        self.bound = bound
+        bounds = [-math.inf] + list(range(-bound, bound + 1)) + [math.inf]
+        intervals = [(lo, hi) for lo in bounds for hi in bounds
+                     if lo <= hi and lo != math.inf and hi != -math.inf]
+        super().__init__([self.BOTTOM] + intervals, (-math.inf, math.inf))
+
+    def round_lo(self, n):
+        return -math.inf if n < -self.bound else min(n, self.bound)
+
+    def round_hi(self, n):
+        return math.inf if n > self.bound else max(n, -self.bound)
+
+    def interval(self, lo, hi):
+        return self.round_lo(lo), self.round_hi(hi)
+
+    def abstract(self, n):
+        return self.index[self.interval(n, n)]
+
+    @staticmethod
+    def mul(a, b):
+        if a == 0 or b == 0:
+            return 0
+        return a * b
+
+    @staticmethod
+    def div(a, b):
+        if math.isinf(b):
+            return 0 if not math.isinf(a) else a * b
+        if math.isinf(a):
+            return a if b > 0 else -a
+        return c_div(a, b)
+
+    def do_arith(self, aop, x, y):
+        (a, b), (c, d) = x, y
+        if aop == Aop.ADD:
+            return self.interval(a + c, b + d)
+        if aop == Aop.SUB:
+            return self.interval(a - d, b - c)
+        if aop == Aop.MUL:
+            products = [self.mul(a, c), self.mul(a, d), self.mul(b, c), self.mul(b, d)]
+            return self.interval(min(products), max(products))
+        # divide by the negative and the positive part of the divisor separately
+        parts = []
+        if c <= -1:
+            parts.append((c, min(d, -1)))
+        if d >= 1:
+            parts.append((max(c, 1), d))
+        if not parts:
+            return self.BOTTOM
+        quotients = [self.div(n, m) for lo, hi in parts for n in (a, b) for m in (lo, hi)]
+        return self.interval(min(quotients), max(quotients))
+
+    def do_cmp(self, rop, x, y):
+        (a, b), (c, d) = x, y
+        if rop in (Rop.EQ, Rop.NEQ):
+            if a == b == c == d:
+                always = True
+            elif b < c or d < a:
+                always = False
+            else:
+                return 0, 1
+            return (1, 1) if always == (rop == Rop.EQ) else (0, 0)
+        if rop == Rop.LT:
+            true, false = b < c, a >= d
+        elif rop == Rop.GT:
+            true, false = a > d, b <= c
+        elif rop == Rop.LTE:
+            true, false = b <= c, a > d
+        else:
+            true, false = a >= d, b < c
+        if true:
+            return 1, 1
+        if false:
+            return 0, 0
+        return 0, 1
+
+    def do_join(self, x, y):
+        if x == self.BOTTOM:
+            return y
+        if y == self.BOTTOM:
+            return x
+        return min(x[0], y[0]), max(x[1], y[1])
+
+    def do_meet(self, x, y):
+        if x == self.BOTTOM or y == self.BOTTOM:
+            return self.BOTTOM
+        lo, hi = max(x[0], y[0]), min(x[1], y[1])
+        if lo > hi:
+            return self.BOTTOM
+        return lo, hi
+
+
+class BlockTransfer:
+    """
+    The effect of a whole basic block on a map from variable names to
+    abstract values, compiled once:
+
+    transfer = BlockTransfer(SignDomain(), block)
+    out_state = transfer.apply(in_state)
+
+    Arith, cmp, copy, select and phi results are computed in the domain,
+    every other definition is top. Variables missing from the state are
+    `default` (top unless given).
+    """
+    COMPUTE = 0
+    COPY = 1
+    JOIN = 2
+    TOP = 3
+
+    def __init__(self, domain: Domain, block: BasicBlock):
+        self.domain = domain
+        self.block = block
+        # constant operands are looked up like variables, under their ir text
+        # (which can't be a variable name)
+        self.constants = {}
+        self.plan = []
+
+        def key(op):
+            if isinstance(op, VarOperand):
+                return op.variable.name
+            name = op.output()
+            self.constants[name] = domain.abstract_operand(op)
+            return name
+
+        for inst in block.body:
+            lhs = getattr(inst, "lhs", None)
+            if lhs is None:
+                continue
+            if isinstance(inst, ArithInst):
+                step = (self.COMPUTE, lhs.name, domain.arith[inst.operation], key(inst.left_op), key(inst.right_op))
+            elif isinstance(inst, CmpInst):
+                step = (self.COMPUTE, lhs.name, domain.cmp[inst.operation], key(inst.left_op), key(inst.right_op))
+            elif isinstance(inst, CopyInst):
+                step = (self.COPY, lhs.name, None, key(inst.rhs), None)
+            elif isinstance(inst, SelectInst):
+                step = (self.JOIN, lhs.name, None, [key(inst.true_op), key(inst.false_op)], None)
+            elif isinstance(inst, PhiInst):
+                step = (self.JOIN, lhs.name, None, [key(op) for op in inst.ops], None)
+            else:
+                step = (self.TOP, lhs.name, None, None, None)
+            self.plan.append(step)
+
+    def apply(self, state: Dict[str, int], default=None) -> Dict[str, int]:
+        domain = self.domain
+        n = domain.size
+        top = domain.top
+        join = domain.join
+        if default is None:
+            default = top
+        env = dict(self.constants)
+        env.update(state)
+        get = env.get
+        compute, copy, join_ops = self.COMPUTE, self.COPY, self.JOIN
+        for kind, dest, table, a, b in self.plan:
+            if kind == compute:
+                env[dest] = table[get(a, default) * n + get(b, default)]
+            elif kind == copy:
+                env[dest] = get(a, default)
+            elif kind == join_ops:
+                value = domain.bottom
+                for op in a:
+                    value = join[value * n + get(op, default)]
+                env[dest] = value
+            else:
+                env[dest] = top
+        for name in self.constants:
+            if name not in state:
+                del env[name]
+        return env
@@ -0,0 +1,412 @@
+from __future__ import annotations
+
+import math
+from typing import Callable
+
+from .constprop import RELATIONS, c_div
+from .ir import *
+
+# Concrete execution of a Program, for checking analysis results against real runs.
+#
+# Before running, every function is lowered into CompiledBlocks: a tuple of
+# closures per block plus a terminal closure returning the next block. Every
+# variable and every constant operand gets a slot in a flat register list, so
+# a closure is just list indexing, e.g. `regs[d] = regs[a] + regs[b]`.
+#
+# Heap model: $alloc creates a fresh HeapObject, and a Pointer is an object plus
+# a path of (array index, field name, ...) inside it. $gep adds to the last array
+# index and appends the field, loads and stores look up the whole path. Memory
+# that was never stored to reads as 0. @nullptr is None, and a function pointer
+# is the CompiledFunction itself (or the external Python callable).
+
+
+class InterpreterError(Exception):
+    pass
+
+
+class HeapObject:
+    __slots__ = ("cells",)
+
+    def __init__(self):
+        self.cells = {}
+
+    def load(self, path):
+        return self.cells.get(path, 0)
+
+    def store(self, path, value):
+        self.cells[path] = value
+
+
+class VarCell:
+    # the memory behind `$addrof x`: the register x in a live frame
+    __slots__ = ("regs", "slot")
+
+    def __init__(self, regs, slot):
+        self.regs = regs
+        self.slot = slot
+
+    def load(self, path):
+        if path != (0,):
+            raise InterpreterError("Out of bounds access to an $addrof pointer")
+        return self.regs[self.slot]
+
+    def store(self, path, value):
+        if path != (0,):
+            raise InterpreterError("Out of bounds access to an $addrof pointer")
+        self.regs[self.slot] = value
+
+
+class Pointer:
+    __slots__ = ("obj", "path")
+
+    def __init__(self, obj, path):
+        self.obj = obj
+        self.path = path
+
+    def __eq__(self, other):
+        return isinstance(other, Pointer) and self.obj is other.obj and self.path == other.path
+
+    def __hash__(self):
+        return hash((id(self.obj), self.path))
+
+    def __repr__(self):
+        return f"<Pointer {id(self.obj):x} {'.'.join(map(str, self.path))}>"
+
+
+class CompiledBlock:
+    __slots__ = ("label", "ops", "terminal", "size", "phi_moves")
+
+    def __init__(self, label):
+        self.label = label
+        self.ops = ()
+        self.terminal = None
+        self.size = 0
+        # predecessor CompiledBlock -> (destination slots, source slots)
+        self.phi_moves = None
+
+
+class CompiledFunction:
+    name: str
+    function: Function
+    slots: Dict[str, int]
+    template: list
+    ret_slot: int
+    entry: CompiledBlock
+
+    def __init__(self, interpreter: Interpreter, function: Function):
+        self.interpreter = interpreter
+        self.name = function.name
+        self.function = function
+        self.slots = {}
+        self.template = []
+        self.ret_slot = 0
+        self.entry = None
+        # op closure -> the instruction it came from, for error messages
+        self.instructions = {}
+
+    def __repr__(self):
+        return f"<CompiledFunction {self.name}>"
+
+    def __call__(self, *args):
+        return self.interpreter.execute(self, args)
+
+
+def _div(a, b):
+    if b == 0:
+        raise InterpreterError("Division by zero")
+    return c_div(a, b)
+
+
+class Interpreter:
+    """
+    Executes functions of a Program.
+
+    `externals` maps names of functions that aren't in the program to Python
+    callables. `max_steps` bounds the number of instructions executed by
+    each `run`, so fuzzed inputs that loop forever raise InterpreterError.
+    """
+    program: Program
+    externals: Dict[str, Callable]
+    functions: Dict[str, CompiledFunction]
+    max_steps: float
+    steps: int
+
+    def __init__(self, program: Program, externals=None, max_steps=None):
+        self.program = program
+        self.externals = dict(externals or {})
+        self.max_steps = math.inf if max_steps is None else max_steps
+        self.steps = 0
+        self.functions = {}
+        for func in program.functions:
+            self.functions[func.name] = CompiledFunction(self, func)
+        for compiled in self.functions.values():
+            self.compile(compiled)
+
+    def run(self, func_name, *args):
+        compiled = self.functions.get(func_name)
+        if compiled is None:
+            raise ValueError(f"No function named {func_name}")
+        self.steps = 0
+        try:
+            return compiled(*args)
+        except RecursionError:
+            raise InterpreterError("Maximum call depth exceeded") from None
+
+    def execute(self, compiled: CompiledFunction, args):
+        if len(args) != len(compiled.function.parameters):
+            raise InterpreterError(f"{compiled.name} expects {len(compiled.function.parameters)} arguments, "
+                                   f"got {len(args)}")
+        regs = compiled.template[:]
+        regs[:len(args)] = args
+        block = compiled.entry
+        max_steps = self.max_steps
+        op = None
+        try:
+            while True:
+                self.steps += block.size
+                if self.steps > max_steps:
+                    raise InterpreterError(f"Exceeded {max_steps} steps")
+                for op in block.ops:
+                    op(regs)
+                op = block.terminal
+                next_block = op(regs)
+                if next_block is None:
+                    return regs[compiled.ret_slot]
+                if next_block.phi_moves is not None:
+                    dests, srcs = next_block.phi_moves[block]
+                    values = [regs[s] for s in srcs]
+                    for d, v in zip(dests, values):
+                        regs[d] = v
+                block = next_block
+        except InterpreterError:
+            raise
+        except (TypeError, AttributeError, KeyError) as e:
+            inst = compiled.instructions.get(op)
+            where = inst.program_point if inst is not None else compiled.name
+            raise InterpreterError(f"At {where}: {e}") from e
+
+    def compile(self, compiled: CompiledFunction):
+        func = compiled.function
+        slots = compiled.slots
+        template = compiled.template
+        constants = {}
+
+        def var_slot(name):
+            slot = slots.get(name)
+            if slot is None:
+                slot = slots[name] = len(template)
+                template.append(0)
+            return slot
+
+        def const_slot(key, value):
+            slot = constants.get(key)
+            if slot is None:
+                slot = constants[key] = len(template)
+                template.append(value)
+            return slot
+
+        def slot_of(op):
+            if isinstance(op, VarOperand):
+                return var_slot(op.variable.name)
+            if isinstance(op, ConstIntOperand):
+                return const_slot(("int", op.value), op.value)
+            if isinstance(op, ConstNullPtrOperand):
+                return const_slot(("nullptr",), None)
+            if isinstance(op, ConstFuncOperand):
+                return const_slot(("func", op.function), self.get_callee(op.function))
+            raise InterpreterError(f"Unknown operand {op.output()}")
+
+        for param in func.parameters:
+            var_slot(param.name)
+        # the return value goes in the register after the parameters
+        compiled.ret_slot = len(template)
+        template.append(0)
+
+        blocks = {label: CompiledBlock(label) for label in func.basic_blocks}
+        for label, block in func.basic_blocks.items():
+            compiled_block = blocks[label]
+            ops = []
+            phis = []
+            for inst in block.body[:-1]:
+                if isinstance(inst, PhiInst):
+                    phis.append(inst)
+                    continue
+                op = self.compile_inst(inst, var_slot, slot_of)
+                compiled.instructions[op] = inst
+                ops.append(op)
+            compiled_block.ops = tuple(ops)
+            compiled_block.size = len(block.body)
+            if phis:
+                compiled_block.phi_moves = self.compile_phis(phis, blocks, var_slot, slot_of)
+            compiled_block.terminal = self.compile_terminal(block.terminal, blocks, slot_of, compiled.ret_slot)
+            compiled.instructions[compiled_block.terminal] = block.terminal
+
+        if func.entry is None:
+            raise InterpreterError(f"{func.name} has no entry block")
+        compiled.entry = blocks[func.entry.label]
+
+    def get_callee(self, name):
+        callee = self.functions.get(name)
+        if callee is None:
+            callee = self.externals.get(name)
+        if callee is None:
+            # only an error if it's actually called
+            def callee(*args):
+                raise InterpreterError(f"Call to unknown function {name}")
+        return callee
+
+    def compile_phis(self, phis, blocks, var_slot, slot_of):
+        moves = {}
+        for phi in phis:
+            if phi.incoming is None:
+                raise InterpreterError(f"{phi.program_point} has no incoming blocks")
+            for pred, op in zip(phi.incoming, phi.ops):
+                dests, srcs = moves.setdefault(blocks[pred.label], ([], []))
+                dests.append(var_slot(phi.lhs.name))
+                srcs.append(slot_of(op))
+        return moves
+
+    def compile_terminal(self, inst, blocks, slot_of, ret):
+        if isinstance(inst, RetInst):
+            v = slot_of(inst.retval)
+
+            def op(regs):
+                regs[ret] = regs[v]
+                return None
+            return op
+
+        if isinstance(inst, JumpInst):
+            target = blocks.get(inst.label)
+            if target is None:
+                raise InterpreterError(f"{inst.program_point} jumps to unknown label {inst.label}")
+
+            def op(regs):
+                return target
+            return op
+
+        if isinstance(inst, BranchInst):
+            c = slot_of(inst.condition)
+            target_true = blocks.get(inst.label_true)
+            target_false = blocks.get(inst.label_false)
+            if target_true is None or target_false is None:
+                raise InterpreterError(f"{inst.program_point} branches to an unknown label")
+
+            def op(regs):
+                return target_true if regs[c] else target_false
+            return op
+
+        raise InterpreterError(f"Unknown terminal {inst.output()}")
+
+    def compile_inst(self, inst, var_slot, slot_of):
+        if isinstance(inst, ArithInst):
+            d, a, b = var_slot(inst.lhs.name), slot_of(inst.left_op), slot_of(inst.right_op)
+            if inst.operation == Aop.ADD:
+                def op(regs):
+                    regs[d] = regs[a] + regs[b]
+            elif inst.operation == Aop.SUB:
+                def op(regs):
+                    regs[d] = regs[a] - regs[b]
+            elif inst.operation == Aop.MUL:
+                def op(regs):
+                    regs[d] = regs[a] * regs[b]
+            else:
+                def op(regs):
+                    regs[d] = _div(regs[a], regs[b])
+            return op
+
+        if isinstance(inst, CmpInst):
+            d, a, b = var_slot(inst.lhs.name), slot_of(inst.left_op), slot_of(inst.right_op)
+            cmp = RELATIONS[inst.operation]
+
+            def op(regs):
+                regs[d] = 1 if cmp(regs[a], regs[b]) else 0
+            return op
+
+        if isinstance(inst, CopyInst):
+            d, s = var_slot(inst.lhs.name), slot_of(inst.rhs)
+
+            def op(regs):
+                regs[d] = regs[s]
+            return op
+
+        if isinstance(inst, SelectInst):
+            d = var_slot(inst.lhs.name)
+            c, t, f = slot_of(inst.condition), slot_of(inst.true_op), slot_of(inst.false_op)
+
+            def op(regs):
+                regs[d] = regs[t] if regs[c] else regs[f]
+            return op
+
+        if isinstance(inst, AllocInst):
+            d = var_slot(inst.lhs.name)
+            root = (0,)
+
+            def op(regs):
+                regs[d] = Pointer(HeapObject(), root)
+            return op
+
+        if isinstance(inst, AddrofInst):
+            d = var_slot(inst.lhs.name)
+            if not isinstance(inst.target, VarOperand):
+                s = slot_of(inst.target)
+
+                def op(regs):
+                    regs[d] = regs[s]
+                return op
+            s = var_slot(inst.target.variable.name)
+            # one VarCell per variable and frame, so all &x are equal pointers;
+            # it's kept in a register of its own ("&x" can't be a variable name)
+            c = var_slot(f"&{inst.target.variable.name}")
+            root = (0,)
+
+            def op(regs):
+                cell = regs[c]
+                if type(cell) is not VarCell:
+                    cell = regs[c] = VarCell(regs, s)
+                regs[d] = Pointer(cell, root)
+            return op
+
+        if isinstance(inst, LoadInst):
+            d, p = var_slot(inst.lhs.name), slot_of(inst.src_ptr)
+
+            def op(regs):
+                ptr = regs[p]
+                regs[d] = ptr.obj.load(ptr.path)
+            return op
+
+        if isinstance(inst, StoreInst):
+            p, v = slot_of(inst.dest), slot_of(inst.value)
+
+            def op(regs):
+                ptr = regs[p]
+                ptr.obj.store(ptr.path, regs[v])
+            return op
+
+        if isinstance(inst, GepInst):
+            d, p, i = var_slot(inst.lhs.name), slot_of(inst.src_ptr), slot_of(inst.array_index)
+            field = (inst.field_name, 0) if inst.field_name else ()
+
+            def op(regs):
+                ptr = regs[p]
+                path = ptr.path
+                regs[d] = Pointer(ptr.obj, path[:-1] + (path[-1] + regs[i],) + field)
+            return op
+
+        if isinstance(inst, CallInst):
+            d = var_slot(inst.lhs.name)
+            callee = self.get_callee(inst.callee)
+            args = tuple(slot_of(arg) for arg in inst.args)
+
+            def op(regs):
+                regs[d] = callee(*[regs[a] for a in args])
+            return op
+
+        if isinstance(inst, ICallInst):
+            d, f = var_slot(inst.lhs.name), slot_of(inst.function)
+            args = tuple(slot_of(arg) for arg in inst.args)
+
+            def op(regs):
+                regs[d] = regs[f](*[regs[a] for a in args])
+            return op
+
+        raise InterpreterError(f"Cannot execute {inst.output()}")
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import abc
 import enum
-from typing import Dict, List
+from typing import Dict, List, Optional, Set, Tuple, Union
 
 
 class Type:
@@ -32,10 +32,18 @@ class StructField:
 class Struct:
     name: str
     fields: List[StructField]
+    field_indices: Dict[str, int]
 
     def __init__(self, name, fields):
         self.name = name
         self.fields = fields
+        self.field_indices = {field.name: i for i, field in enumerate(fields)}
+
+    def get_field(self, field_name) -> Optional[StructField]:
+        index = self.field_indices.get(field_name)
+        if index is None:
+            return None
+        return self.fields[index]
 
 
 class Variable:
@@ -109,10 +117,37 @@ class ConstNullPtrOperand(Operand):
 class Program:
     structs: List[Struct]
     functions: List[Function]
+    struct_table: Dict[str, Struct]
+    field_table: Dict[Tuple[str, str], Tuple[int, Type]]
 
     def __init__(self, structs, functions):
         self.structs = structs
         self.functions = functions
+        self.struct_table = {}
+        self.field_table = {}
+        for struct in structs:
+            self.struct_table[struct.name] = struct
+            for i, field in enumerate(struct.fields):
+                self.field_table[(struct.name, field.name)] = (i, field.type)
+        for func in functions:
+            if isinstance(func, LazyFunction):
+                # resolved once it's materialized
+                func.program = self
+            else:
+                self.resolve_fields(func)
+
+    def get_struct(self, struct_name) -> Optional[Struct]:
+        return self.struct_table.get(struct_name)
+
+    def get_field(self, struct_name, field_name) -> Optional[Tuple[int, Type]]:
+        # (index, type) of a struct field, or None if there is no such field
+        return self.field_table.get((struct_name, field_name))
+
+    def resolve_fields(self, func):
+        for basic_block in func.basic_blocks.values():
+            for inst in basic_block.body:
+                if isinstance(inst, GepInst):
+                    inst.resolve_field(self)
 
     def get_function(self, func_name):
         for func in self.functions:
@@ -161,18 +196,23 @@ class Function:
         self.name = name
         self.return_type = return_type
         self.parameters = parameters
+        self.set_basic_blocks(basic_blocks)
+        type_str = f"{return_type}[{','.join(str(p.type) for p in parameters)}]"
+        self.type = Type(type_str)
+        self.address_taken = False
+
+    def set_basic_blocks(self, basic_blocks):
         self.basic_blocks = {}
         for basic_block in basic_blocks:
             self.basic_blocks[basic_block.label] = basic_block
             basic_block.parent_function = self
         self.entry = self.basic_blocks.get("entry")
+        # None if no block returns (any more)
+        self.exit = None
         for basic_block in self.basic_blocks.values():
             basic_block.resolve_labels()
             if isinstance(basic_block.terminal, RetInst):
                 self.exit = basic_block
-        type_str = f"{return_type}[{','.join(str(p.type) for p in parameters)}]"
-        self.type = Type(type_str)
-        self.address_taken = False
 
     def __repr__(self):
         return f"<Function {self.name}>"
@@ -186,6 +226,61 @@ class Function:
         return out
 
 
+class LazyFunction(Function):
+    """
+    A function whose body hasn't been parsed yet (see Parser's `lazy` mode).
+
+    The body is parsed the first time `basic_blocks`, `entry` or `exit` is
+    used, after which the object becomes a plain Function.
+    """
+    source: str
+    body_start: int
+    program: Optional[Program]
+
+    def __init__(self, name, return_type, parameters, source, body_start):
+        self.name = name
+        self.return_type = return_type
+        self.parameters = parameters
+        self.source = source
+        self.body_start = body_start
+        self.program = None
+        type_str = f"{return_type}[{','.join(str(p.type) for p in parameters)}]"
+        self.type = Type(type_str)
+        self.address_taken = False
+
+    def __repr__(self):
+        return f"<LazyFunction {self.name}>"
+
+    def materialize(self):
+        from .parser import Parser
+        parser = Parser("")
+        parser.text = self.source
+        parser.pos = self.body_start
+        basic_blocks = parser.parse_basic_blocks()
+        program = self.program
+        del self.source, self.body_start, self.program
+        # from now on the attributes are plain instance attributes again
+        self.__class__ = Function
+        self.set_basic_blocks(basic_blocks)
+        if program is not None:
+            program.resolve_fields(self)
+
+    @property
+    def basic_blocks(self) -> Dict[str, BasicBlock]:
+        self.materialize()
+        return self.basic_blocks
+
+    @property
+    def entry(self) -> BasicBlock:
+        self.materialize()
+        return self.entry
+
+    @property
+    def exit(self) -> BasicBlock:
+        self.materialize()
+        return self.exit
+
+
 class BasicBlock:
     label: str
     body: List[Instruction]
@@ -196,6 +291,10 @@ class BasicBlock:
         self.entry_store = None
         self.terminal_store = None
         self.label = label
+        self.set_body(body)
+
+    def set_body(self, body):
+        # (re)number the instructions, e.g. after a pass inserts or removes some
         self.body = body
         self.terminal = body[-1]
         for i, inst in enumerate(body):
@@ -238,6 +337,10 @@ class Instruction:
     def program_point(self):
         return f"{self.parent_block.name}.{self.index}"
 
+    def operands(self) -> List[Operand]:
+        # every operand the instruction reads
+        return []
+
     def output(self):
         raise NotImplementedError
 
@@ -261,6 +364,9 @@ class ArithInst(Instruction):
         self.right_op = right_op
         self.operation = operation
 
+    def operands(self):
+        return [self.left_op, self.right_op]
+
     def output(self):
         return f"{self.lhs.output()} = $arith {self.operation.value} {self.left_op.output()} {self.right_op.output()}"
 
@@ -286,6 +392,9 @@ class CmpInst(Instruction):
         self.right_op = right_op
         self.operation = operation
 
+    def operands(self):
+        return [self.left_op, self.right_op]
+
     def output(self):
         return f"{self.lhs.output()} = $cmp {self.operation.value} {self.left_op.output()} {self.right_op.output()}"
 
@@ -293,10 +402,16 @@ class CmpInst(Instruction):
 class PhiInst(Instruction):
     lhs: Variable
     ops: List[Operand]
+    # predecessor block each op flows in from, if known (set by ssa.construct_ssa)
+    incoming: Optional[List[BasicBlock]]
 
-    def __init__(self, lhs, ops):
+    def __init__(self, lhs, ops, incoming=None):
         self.lhs = lhs
         self.ops = ops
+        self.incoming = incoming
+
+    def operands(self):
+        return list(self.ops)
 
     def output(self):
         return f"{self.lhs.output()} = $phi({', '.join(op.output() for op in self.ops)})"
@@ -310,6 +425,9 @@ class CopyInst(Instruction):
         self.lhs = lhs
         self.rhs = rhs
 
+    def operands(self):
+        return [self.rhs]
+
     def output(self):
         return f"{self.lhs.output()} = $copy {self.rhs.output()}"
 
@@ -332,6 +450,9 @@ class AddrofInst(Instruction):
         self.lhs = lhs
         self.target = target
 
+    def operands(self):
+        return [self.target]
+
     def output(self):
         return f"{self.lhs.output()} = $addrof {self.target.output()}"
 
@@ -344,6 +465,9 @@ class LoadInst(Instruction):
         self.lhs = lhs
         self.src_ptr = src_ptr
 
+    def operands(self):
+        return [self.src_ptr]
+
     def output(self):
         return f"{self.lhs.output()} = $load {self.src_ptr.output()}"
 
@@ -356,6 +480,9 @@ class StoreInst(Instruction):
         self.dest = dest
         self.value = value
 
+    def operands(self):
+        return [self.dest, self.value]
+
     def output(self):
         return f"$store {self.dest.output()} {self.value.output()}"
 
@@ -365,12 +492,36 @@ class GepInst(Instruction):
     src_ptr: Operand
     array_index: Operand
     field_name: str
+    # set by resolve_field; None when there is no field (or it can't be found)
+    struct: Optional[Struct]
+    field_index: Optional[int]
+    field_type: Optional[Type]
 
     def __init__(self, lhs, src_ptr, array_index, field_name):
         self.lhs = lhs
         self.src_ptr = src_ptr
         self.array_index = array_index
         self.field_name = field_name
+        self.struct = None
+        self.field_index = None
+        self.field_type = None
+
+    def resolve_field(self, program):
+        if not self.field_name:
+            return
+        if isinstance(self.src_ptr, VarOperand):
+            ptr_type = self.src_ptr.variable.type
+        else:
+            ptr_type = getattr(self.src_ptr, "type", None)
+        if ptr_type is None or ptr_type.indirection != 1:
+            return
+        self.struct = program.get_struct(ptr_type.base_type)
+        field = program.get_field(ptr_type.base_type, self.field_name)
+        if field is not None:
+            self.field_index, self.field_type = field
+
+    def operands(self):
+        return [self.src_ptr, self.array_index]
 
     def output(self):
         return f"{self.lhs.output()} = $gep {self.src_ptr.output()} {self.array_index.output()} {self.field_name}".strip()
@@ -388,6 +539,9 @@ class SelectInst(Instruction):
         self.true_op = true_op
         self.false_op = false_op
 
+    def operands(self):
+        return [self.condition, self.true_op, self.false_op]
+
     def output(self):
         return f"{self.lhs.output()} = $select {self.condition.output()} {self.true_op.output()} {self.false_op.output()}"
 
@@ -403,6 +557,9 @@ class CallInst(Instruction):
         self.callee = callee
         self.args = args
 
+    def operands(self):
+        return list(self.args)
+
     def output(self):
         return f"{self.lhs.output()} = $call {self.callee}({', '.join(arg.output() for arg in self.args)})"
 
@@ -418,6 +575,9 @@ class ICallInst(Instruction):
         self.function = function
         self.args = args
 
+    def operands(self):
+        return [self.function] + self.args
+
     def output(self):
         return f"{self.lhs.output()} = $icall {self.function.output()}({', '.join(arg.output() for arg in self.args)})"
 
@@ -437,6 +597,9 @@ class RetInst(TerminalInst):
     def targets(self):
         return []
 
+    def operands(self):
+        return [self.retval]
+
     def output(self):
         return f"$ret {self.retval.output()}"
 
@@ -470,6 +633,9 @@ class BranchInst(TerminalInst):
     def targets(self):
         return [self.target_true, self.target_false]
 
+    def operands(self):
+        return [self.condition]
+
     def output(self):
         return f"$branch {self.condition.output()} {self.label_true} {self.label_false}"
 
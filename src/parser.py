@@ -1,29 +1,60 @@
 from .ir import *
+import contextlib
 import re
+import sys
+
+
+_patterns = {}
+_whitespace = re.compile(r"\s*")
+_func_address = re.compile(r"@([\w\.]+):")
+
+
+def _pattern(expression):
+    pattern = _patterns.get(expression)
+    if pattern is None:
+        pattern = _patterns[expression] = re.compile(expression, flags=re.DOTALL)
+    return pattern
 
 
 class Parser:
-    remaining_text: str
+    # the text is never copied, `pos` is where the remaining text starts
+    text: str
+    pos: int
+    lazy: bool
     address_taken_functions: Set[str]
 
-    def __init__(self, text: str):
-        self.remaining_text = text.strip()
+    def __init__(self, text: str, lazy=False):
+        """
+        With `lazy`, function bodies are skipped over and only parsed when the
+        function's basic blocks are first needed (see LazyFunction).
+        """
+        self.text = text.strip()
+        self.pos = 0
+        self.lazy = lazy
         self.address_taken_functions = set()
 
+    @property
+    def remaining_text(self) -> str:
+        return self.text[self.pos:]
+
+    @remaining_text.setter
+    def remaining_text(self, value):
+        self.text = value
+        self.pos = 0
+
     def consume(self, expression):
-        result = re.match(f"^({expression})(.*)$", self.remaining_text, flags=re.DOTALL)
+        result = _pattern(expression).match(self.text, self.pos)
         if result is None:
             raise ValueError(f"Failed to consume '{expression}'")
-        token, remaining = result.groups()
-        self.remaining_text = remaining.lstrip()
-        return token.strip()
+        self.pos = _whitespace.match(self.text, result.end()).end()
+        return result.group().strip()
 
     def lookahead_re(self, expression):
-        result = re.match(f"^({expression})(.*)$", self.remaining_text, flags=re.DOTALL)
+        result = _pattern(expression).match(self.text, self.pos)
         return result is not None
 
     def lookahead(self, value):
-        return self.remaining_text.startswith(value)
+        return self.text.startswith(value, self.pos)
 
     def parse_program(self) -> Program:
         structs = self.parse_structs()
@@ -80,11 +111,31 @@ class Parser:
         self.consume("->")
         return_type = self.parse_type()
         self.consume(r"\{")
+        if self.lazy:
+            return self.skip_function_body(name, return_type, params)
+        basic_blocks = self.parse_basic_blocks()
+        self.consume(r"\}")
+        return Function(name, return_type, params, basic_blocks)
+
+    def parse_basic_blocks(self) -> List[BasicBlock]:
         basic_blocks = []
         while not self.lookahead("}"):
             basic_blocks.append(self.parse_basic_block())
+        return basic_blocks
+
+    def skip_function_body(self, name, return_type, params) -> LazyFunction:
+        # bodies have no braces in them, so the body ends at the next one
+        start = self.pos
+        end = self.text.find("}", start)
+        if end == -1:
+            raise ValueError(f"Failed to find the end of function {name}")
+        # functions whose address is taken elsewhere, without parsing the body
+        for func_name in _func_address.findall(self.text, start, end):
+            if func_name != "nullptr":
+                self.address_taken_functions.add(func_name)
+        self.pos = end
         self.consume(r"\}")
-        return Function(name, return_type, params, basic_blocks)
+        return LazyFunction(name, return_type, params, self.text, start)
 
     def parse_basic_block(self) -> BasicBlock:
         label = self.parse_label()
@@ -228,9 +279,11 @@ class Parser:
         return self.consume(r"[\w\.]+")
 
     def parse_type(self):
+        start = self.pos
         type_ = self.consume(r"[\w\[\]\*,]+[\s\(\),]")
         if type_[-1] in "(),":
-            self.remaining_text = type_[-1] + self.remaining_text
+            # give back the delimiter
+            self.pos = start + len(type_) - 1
             type_ = type_[:-1]
         indirection = 0
         while type_.endswith("*"):
@@ -263,13 +316,39 @@ class Parser:
         return Variable(name, type_)
 
 
-if __name__ == "__main__":
-    import sys
+def main():
+    import argparse
     import glob
 
-    for path in glob.glob(sys.argv[1]):
-        with open(path, "r") as f:
-            ir_text = f.read()
+    arg_parser = argparse.ArgumentParser(description="Parse ir files, to make sure they don't crash the parser")
+    arg_parser.add_argument("pattern", help="glob of ir files, e.g. \"path/to/some/*.ir\"")
+    arg_parser.add_argument("--profile", nargs="?", const="-", metavar="FILE",
+                            help="write profiling results as JSON to FILE (default: stdout)")
+    args = arg_parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        prof = None
+        if args.profile is not None:
+            from .profiling import profile
+            prof = stack.enter_context(profile())
+
+        for path in glob.glob(args.pattern):
+            with open(path, "r") as f:
+                ir_text = f.read()
 
-        prog = Parser(ir_text).parse_program()
-        print(f"Parsed '{path}' without errors")
+            prog = Parser(ir_text).parse_program()
+            # keep stdout valid JSON when the profile goes there
+            print(f"Parsed '{path}' without errors", file=sys.stderr if args.profile == "-" else sys.stdout)
+
+    if prof is not None:
+        if args.profile == "-":
+            print(prof.to_json())
+        else:
+            with open(args.profile, "w") as f:
+                f.write(prof.to_json() + "\n")
+
+
+if __name__ == "__main__":
+    # go through the package module, so --profile instruments the same Parser class
+    from src.parser import main
+    main()
@@ -0,0 +1,408 @@
+from __future__ import annotations
+
+import time
+
+from .ir import *
+
+# Demand-driven, inclusion-based (Andersen style) points-to analysis.
+#
+# Instead of solving for every variable of the program, a query only pulls in
+# the constraints its answer depends on: the definitions of the variable, the
+# variables those read from, the stores that may write what a load reads,
+# the call sites feeding a parameter, and so on, added lazily as points-to
+# facts are discovered. Everything found is kept, so later queries reuse it.
+#
+# Abstract objects are strings:
+#   "<program point>"   memory allocated by the $alloc there
+#   "&<func>.<var>"     the variable, for $addrof
+#   "@<func>"           a function
+# Fields are not distinguished: a $gep points to whatever its base does.
+#
+# To find the stores that may write an object without solving for every
+# store pointer, a cheap unification-based (Steensgaard style) pass over the
+# whole program groups locations into alias classes first. It is coarser
+# than the demand analysis but sound, so only the stores whose pointer's
+# class points to the object's class are looked at.
+
+
+class AliasClasses:
+    """
+    Union-find over locations (variable nodes and objects), where each class
+    points to at most one other class. join() merges two classes, and
+    with them the classes they point to.
+    """
+
+    def __init__(self):
+        self.parent = {}
+        self.pointee = {}  # class -> class it points to
+        self.fresh = 0
+
+    def find(self, x):
+        parent = self.parent.setdefault(x, x)
+        while parent != x:
+            grandparent = self.parent[parent]
+            self.parent[x] = grandparent
+            x, parent = parent, grandparent
+        return x
+
+    def points_to(self, x):
+        # the class x points to, a new empty one if there is none yet
+        x = self.find(x)
+        if x not in self.pointee:
+            self.fresh += 1
+            self.pointee[x] = ("#", self.fresh)
+        return self.find(self.pointee[x])
+
+    def join(self, a, b):
+        work = [(a, b)]
+        while work:
+            a, b = work.pop()
+            a, b = self.find(a), self.find(b)
+            if a == b:
+                continue
+            self.parent[b] = a
+            pointee_b = self.pointee.pop(b, None)
+            if pointee_b is not None:
+                if a in self.pointee:
+                    work.append((self.pointee[a], pointee_b))
+                else:
+                    self.pointee[a] = pointee_b
+
+
+class PointsToResult:
+    objects: Set[str]
+    # False if the budget ran out, in which case `objects` is every object
+    # in the program (a safe over-approximation)
+    complete: bool
+
+    def __init__(self, objects, complete):
+        self.objects = objects
+        self.complete = complete
+
+    def __repr__(self):
+        return f"<PointsToResult {sorted(self.objects)}{'' if self.complete else ' (incomplete)'}>"
+
+
+class DemandPointsTo:
+    """
+    demand = DemandPointsTo(program)
+    demand.points_to("main", "p").objects
+
+    `budget` bounds the propagation steps and `timeout` the seconds a single
+    query may spend. When either runs out the query gives up with an
+    incomplete result, but the work done so far is kept for the next query.
+    """
+
+    def __init__(self, program: Program, budget=None, timeout=None):
+        self.program = program
+        self.budget = budget
+        self.timeout = timeout
+
+        # index of the pointer-relevant statements, built in one pass
+        # node -> [("base", obj) | ("copy", (func, operand)) | ("load", (func, pointer operand))
+        #          | ("call", callee) | ("icall", (func, function operand))]
+        self.defs = {}
+        self.params = {}          # function name -> parameter nodes
+        self.returns = {}         # function name -> returned operands
+        self.calls_to = {}        # function name -> [(caller, args)]
+        self.icalls = []          # [(caller, function operand, args, lhs node)]
+        self.stores = []          # [(caller, pointer operand, value operand)]
+        self.all_objects = set()
+        for func in program.functions:
+            self.index_function(func)
+        self.aliases = AliasClasses()
+        self.stores_to = {}       # alias class -> stores whose pointer points to it
+        self.index_aliases()
+
+        # solver state, kept between queries
+        self.pts = {}             # node -> objects
+        self.succs = {}           # node -> nodes whose points-to sets include it
+        self.demanded = set()
+        self.load_watch = {}      # pointer node -> nodes loading through it
+        self.store_watch = {}     # pointer node -> operands stored through it
+        self.icall_watch = {}     # function operand node -> icall sites
+        self.worklist = []        # (node, new objects)
+        self.to_expand = []       # demanded nodes whose constraints aren't added yet
+        self.steps = 0
+
+    def index_function(self, func: Function):
+        name = func.name
+        self.params[name] = [(name, param.name) for param in func.parameters]
+        self.all_objects.add(f"@{name}")
+        returns = self.returns.setdefault(name, [])
+        for block in func.basic_blocks.values():
+            for inst in block.body:
+                lhs = getattr(inst, "lhs", None)
+                node = (name, lhs.name) if lhs is not None else None
+                if isinstance(inst, AllocInst):
+                    self.add_def(node, ("base", inst.program_point))
+                    self.all_objects.add(inst.program_point)
+                elif isinstance(inst, AddrofInst):
+                    if isinstance(inst.target, VarOperand):
+                        obj = f"&{name}.{inst.target.variable.name}"
+                        self.add_def(node, ("base", obj))
+                        self.all_objects.add(obj)
+                    else:
+                        self.add_def(node, ("copy", (name, inst.target)))
+                elif isinstance(inst, (CopyInst, PhiInst, SelectInst, GepInst)):
+                    if isinstance(inst, CopyInst):
+                        ops = [inst.rhs]
+                    elif isinstance(inst, PhiInst):
+                        ops = inst.ops
+                    elif isinstance(inst, SelectInst):
+                        ops = [inst.true_op, inst.false_op]
+                    else:
+                        ops = [inst.src_ptr]
+                    for op in ops:
+                        self.add_def(node, ("copy", (name, op)))
+                elif isinstance(inst, LoadInst):
+                    self.add_def(node, ("load", (name, inst.src_ptr)))
+                elif isinstance(inst, StoreInst):
+                    self.stores.append((name, inst.dest, inst.value))
+                elif isinstance(inst, CallInst):
+                    self.add_def(node, ("call", inst.callee))
+                    self.calls_to.setdefault(inst.callee, []).append((name, inst.args))
+                elif isinstance(inst, ICallInst):
+                    self.add_def(node, ("icall", (name, inst.function)))
+                    self.icalls.append((name, inst.function, inst.args, node))
+                elif isinstance(inst, RetInst):
+                    returns.append(inst.retval)
+
+    def add_def(self, node, definition):
+        self.defs.setdefault(node, []).append(definition)
+
+    def index_aliases(self):
+        aliases = self.aliases
+
+        def value(func_name, op):
+            # the class of the locations an operand may point to
+            node, obj = self.operand_source(func_name, op)
+            if node is not None:
+                return aliases.points_to(node)
+            return obj
+
+        def assign(node, func_name, op):
+            target = value(func_name, op)
+            if target is not None:
+                aliases.join(aliases.points_to(node), target)
+
+        address_taken = [func.name for func in self.program.functions if func.address_taken]
+        for node, definitions in self.defs.items():
+            if node is None:
+                continue
+            for kind, data in definitions:
+                if kind == "base":
+                    aliases.join(aliases.points_to(node), data)
+                    if data.startswith("&"):
+                        # the object of a variable is the variable itself
+                        aliases.join(data, tuple(data[1:].split(".", 1)))
+                elif kind == "copy":
+                    assign(node, *data)
+                elif kind == "load":
+                    pointer = value(*data)
+                    if pointer is not None:
+                        aliases.join(aliases.points_to(node), aliases.points_to(pointer))
+                else:
+                    # an icall may call any function whose address is taken
+                    for callee in [data] if kind == "call" else address_taken:
+                        for retval in self.returns.get(callee, []):
+                            assign(node, callee, retval)
+        sites = [(caller, callee, args) for callee, calls in self.calls_to.items() for caller, args in calls]
+        sites += [(caller, callee, args) for caller, _, args, _ in self.icalls for callee in address_taken]
+        for caller, callee, args in sites:
+            for param, arg in zip(self.params.get(callee, []), args):
+                assign(param, caller, arg)
+        for caller, pointer_op, value_op in self.stores:
+            pointer = value(caller, pointer_op)
+            contents = value(caller, value_op)
+            if pointer is not None and contents is not None:
+                aliases.join(aliases.points_to(pointer), contents)
+
+        # only now are the classes final
+        for store in self.stores:
+            pointer, _ = self.operand_source(store[0], store[1])
+            if pointer is not None:
+                self.stores_to.setdefault(aliases.find(aliases.points_to(pointer)), []).append(store)
+
+    def points_to(self, func_name, var_name) -> PointsToResult:
+        return self.query((func_name, var_name))
+
+    def points_to_operand(self, inst: Instruction, op: Operand) -> PointsToResult:
+        # e.g. points_to_operand(load, load.src_ptr)
+        return self.query_operand(inst.parent_block.parent_function.name, op)
+
+    def may_alias(self, func_a, var_a, func_b, var_b) -> bool:
+        return bool(self.points_to(func_a, var_a).objects & self.points_to(func_b, var_b).objects)
+
+    def query_operand(self, func_name, op) -> PointsToResult:
+        if isinstance(op, VarOperand):
+            return self.query((func_name, op.variable.name))
+        if isinstance(op, ConstFuncOperand):
+            return PointsToResult({f"@{op.function}"}, True)
+        return PointsToResult(set(), True)
+
+    def query(self, node) -> PointsToResult:
+        self.demand(node)
+        if not self.solve():
+            return PointsToResult(set(self.all_objects), False)
+        return PointsToResult(set(self.pts[node]), True)
+
+    # --- the lazily built constraint graph ---
+
+    def operand_source(self, func_name, op):
+        # the node an operand reads, or the object it is, or neither
+        if isinstance(op, VarOperand):
+            return (func_name, op.variable.name), None
+        if isinstance(op, ConstFuncOperand):
+            return None, f"@{op.function}"
+        return None, None
+
+    def flow(self, func_name, op, dest):
+        # everything op may point to flows into dest
+        node, obj = self.operand_source(func_name, op)
+        if node is not None:
+            self.add_edge(node, dest)
+        elif obj is not None:
+            self.add_objects(dest, {obj})
+
+    def add_edge(self, src, dest):
+        succs = self.succs.setdefault(src, set())
+        if dest in succs:
+            return
+        succs.add(dest)
+        self.demand(src)
+        if self.pts[src]:
+            self.worklist.append((dest, set(self.pts[src])))
+
+    def add_objects(self, node, objects):
+        self.worklist.append((node, set(objects)))
+
+    def demand(self, node):
+        # expanded later by solve(), so long chains don't recurse
+        if node in self.demanded:
+            return
+        self.demanded.add(node)
+        self.pts.setdefault(node, set())
+        self.to_expand.append(node)
+
+    def expand(self, node):
+        # add the constraints the points-to set of node depends on
+        if node[0] == "*":
+            self.demand_contents(node)
+            return
+
+        func_name, var_name = node
+        # what is stored through its address is in the variable too
+        obj = f"&{func_name}.{var_name}"
+        if obj in self.all_objects:
+            self.add_edge(("*", obj), node)
+        for kind, data in self.defs.get(node, []):
+            if kind == "base":
+                self.add_objects(node, {data})
+            elif kind == "copy":
+                self.flow(func_name, data[1], node)
+            elif kind == "load":
+                pointer, _ = self.operand_source(func_name, data[1])
+                if pointer is not None:
+                    self.load_watch.setdefault(pointer, []).append(node)
+                    self.demand(pointer)
+                    for obj in list(self.pts[pointer]):
+                        self.add_edge(("*", obj), node)
+            elif kind == "call":
+                for retval in self.returns.get(data, []):
+                    self.flow(data, retval, node)
+            elif kind == "icall":
+                self.watch_icall(func_name, data[1])
+
+        # a parameter: every call site that may call this function
+        if node in self.params.get(func_name, []):
+            index = self.params[func_name].index(node)
+            for caller, args in self.calls_to.get(func_name, []):
+                if index < len(args):
+                    self.flow(caller, args[index], node)
+            for caller, function, args, lhs in self.icalls:
+                self.watch_icall(caller, function)
+
+    def watch_icall(self, caller, function):
+        pointer, obj = self.operand_source(caller, function)
+        if pointer is None:
+            if obj is not None:
+                for site in self.icalls:
+                    if site[0] == caller and site[1] is function:
+                        self.connect_icall(site, obj)
+            return
+        if pointer not in self.icall_watch:
+            self.icall_watch[pointer] = [site for site in self.icalls
+                                         if self.operand_source(site[0], site[1])[0] == pointer]
+            self.demand(pointer)
+        for obj in list(self.pts[pointer]):
+            for site in self.icall_watch[pointer]:
+                self.connect_icall(site, obj)
+
+    def connect_icall(self, site, obj):
+        caller, _, args, lhs = site
+        callee = obj[1:]
+        if not obj.startswith("@") or callee not in self.params:
+            return
+        if lhs in self.demanded:
+            for retval in self.returns[callee]:
+                self.flow(callee, retval, lhs)
+        for param, arg in zip(self.params[callee], args):
+            if param in self.demanded:
+                self.flow(caller, arg, param)
+
+    def demand_contents(self, node):
+        # what an object may contain: everything stored through a pointer to it
+        obj = node[1]
+        if obj.startswith("&"):
+            func_name, var_name = obj[1:].split(".", 1)
+            self.add_edge((func_name, var_name), node)
+        for caller, pointer_op, value in self.stores_to.get(self.aliases.find(obj), []):
+            pointer, _ = self.operand_source(caller, pointer_op)
+            if pointer is None:
+                continue
+            watch = self.store_watch.setdefault(pointer, [])
+            if (caller, value) not in watch:
+                watch.append((caller, value))
+            self.demand(pointer)
+            if obj in self.pts[pointer]:
+                self.flow(caller, value, node)
+
+    def on_new_objects(self, node, new):
+        # react to `node` pointing to more objects
+        for dest in self.load_watch.get(node, []):
+            for obj in new:
+                self.add_edge(("*", obj), dest)
+        for caller, value in self.store_watch.get(node, []):
+            for obj in new:
+                contents = ("*", obj)
+                if contents in self.demanded:
+                    self.flow(caller, value, contents)
+        for site in self.icall_watch.get(node, []):
+            for obj in new:
+                self.connect_icall(site, obj)
+
+    def solve(self) -> bool:
+        # difference propagation, returning False if out of budget or time
+        start = time.perf_counter()
+        steps = 0
+        while self.worklist or self.to_expand:
+            if self.budget is not None and steps >= self.budget:
+                return False
+            if self.timeout is not None and steps % 256 == 0 and time.perf_counter() - start > self.timeout:
+                return False
+            steps += 1
+            self.steps += 1
+            if self.to_expand:
+                self.expand(self.to_expand.pop())
+                continue
+            node, objects = self.worklist.pop()
+            pts = self.pts.setdefault(node, set())
+            new = objects - pts
+            if not new:
+                continue
+            pts |= new
+            for dest in self.succs.get(node, ()):
+                self.worklist.append((dest, new))
+            self.on_new_objects(node, new)
+        return True
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import contextlib
+import functools
+import json
+import time
+import tracemalloc
+from typing import Dict, Optional
+
+from . import ir, parser, set_constraints
+
+# Optional instrumentation of the parser and analyses.
+#
+#   with profile() as prof:
+#       program = Parser(text).parse_program()
+#   print(prof.to_json())
+#
+# Nothing is instrumented unless a profile is active: entering `profile()`
+# wraps the methods below (and the `re` module of set_constraints) with
+# timing/counting versions, and leaving it puts the originals back, so there
+# is no overhead at all when profiling is off.
+
+# (class, method name): timed, reported as "<class>.<method>"
+TIMED = [
+    (parser.Parser, "parse_program"),
+    (parser.Parser, "parse_structs"),
+    (parser.Parser, "parse_functions"),
+    (parser.Parser, "parse_function"),
+    (ir.LazyFunction, "materialize"),
+    (ir.BasicBlock, "resolve_labels"),
+    (ir.Program, "resolve_fields"),
+    (ir.Program, "get_inst"),
+    (set_constraints.SetConstraints, "parse"),
+    (set_constraints.SetConstraints, "add_parsed_constraint"),
+    (set_constraints.SetConstraints, "to_text"),
+    (set_constraints.SetConstraints, "write_text"),
+    (set_constraints.SetConstraints, "write_binary"),
+    (set_constraints.SetConstraints, "read_binary"),
+]
+
+# (class, method name, counter names): calls are counted
+COUNTED = [
+    (parser.Parser, "consume", ["tokens consumed", "regex matches"]),
+    (parser.Parser, "lookahead_re", ["regex matches"]),
+]
+
+# modules whose `re` gets swapped for one counting "regex matches"
+REGEX_MODULES = [set_constraints]
+
+# every class constructed in these modules is counted in `allocations`
+ALLOCATION_MODULES = [ir, set_constraints]
+
+
+class Profile:
+    timers: Dict[str, float]
+    calls: Dict[str, int]
+    counters: Dict[str, int]
+    allocations: Dict[str, int]
+    peak_memory: Optional[int]
+
+    def __init__(self):
+        self.timers = {}
+        self.calls = {}
+        self.counters = {}
+        self.allocations = {}
+        self.peak_memory = None
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        # time an arbitrary block of code, e.g. a whole analysis
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        self.timers[name] = self.timers.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def to_dict(self):
+        return {
+            "timers": {name: {"seconds": self.timers[name], "calls": self.calls[name]}
+                       for name in sorted(self.timers)},
+            "counters": dict(sorted(self.counters.items())),
+            "allocations": dict(sorted(self.allocations.items())),
+            "peak_memory": self.peak_memory,
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+
+class _CountingRe:
+    # stands in for the `re` module inside an instrumented module
+    def __init__(self, prof: Profile, re_module):
+        self._prof = prof
+        self._re = re_module
+
+    def match(self, *args, **kwargs):
+        self._prof.count("regex matches")
+        return self._re.match(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._re, name)
+
+
+def _timed(prof, name, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            prof.add_time(name, time.perf_counter() - start)
+    return wrapper
+
+
+def _counted(prof, names, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        for name in names:
+            prof.count(name)
+        return method(*args, **kwargs)
+    return wrapper
+
+
+def _allocation_counted(prof, cls, init):
+    @functools.wraps(init)
+    def wrapper(self, *args, **kwargs):
+        # count each object once, in the most derived __init__
+        owner = next(c for c in type(self).__mro__ if "__init__" in vars(c))
+        if owner is cls:
+            name = type(self).__name__
+            prof.allocations[name] = prof.allocations.get(name, 0) + 1
+        return init(self, *args, **kwargs)
+    return wrapper
+
+
+_active: Optional[Profile] = None
+
+
+@contextlib.contextmanager
+def profile(trace_memory=True):
+    """
+    Instrument the parser and analyses while the block runs, yielding the
+    Profile the results are collected in. `trace_memory` records the peak
+    traced memory with tracemalloc (which is slow, but only while active).
+    """
+    global _active
+    if _active is not None:
+        raise RuntimeError("Already profiling")
+    prof = Profile()
+    patches = []  # (owner, attribute, original value)
+
+    def patch(owner, attr, value):
+        patches.append((owner, attr, vars(owner)[attr]))
+        setattr(owner, attr, value)
+
+    for cls, attr in TIMED:
+        original = vars(cls)[attr]
+        if isinstance(original, staticmethod):
+            patch(cls, attr, staticmethod(_timed(prof, f"{cls.__name__}.{attr}", original.__func__)))
+        else:
+            patch(cls, attr, _timed(prof, f"{cls.__name__}.{attr}", original))
+    for cls, attr, names in COUNTED:
+        patch(cls, attr, _counted(prof, names, vars(cls)[attr]))
+    for module in REGEX_MODULES:
+        patch(module, "re", _CountingRe(prof, module.re))
+    for module in ALLOCATION_MODULES:
+        for value in list(vars(module).values()):
+            if isinstance(value, type) and value.__module__ == module.__name__ and "__init__" in vars(value):
+                patch(value, "__init__", _allocation_counted(prof, value, vars(value)["__init__"]))
+
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    _active = prof
+    try:
+        yield prof
+    finally:
+        _active = None
+        if trace_memory:
+            prof.peak_memory = tracemalloc.get_traced_memory()[1]
+        if started_tracing:
+            tracemalloc.stop()
+        for owner, attr, original in reversed(patches):
+            setattr(owner, attr, original)
+
+
+def active_profile() -> Optional[Profile]:
+    # the Profile being collected, if any, for code that wants to add its own phases
+    return _active
@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import mmap
+import struct
+from array import array
+from typing import Iterable
+
+from .binary import from_little_endian, to_little_endian
+from .ir import *
+
+# A file of analysis results with one row per program point, read through
+# mmap, so a query only touches the pages it needs instead of loading (or
+# parsing) everything.
+#
+#   builder = ResultStoreBuilder.for_program(program)
+#   builder.add_int_column("sign", {point: sign for each instruction})
+#   builder.add_bitset_column("reaching", {point: program points reaching it})
+#   builder.write("results.bin")
+#
+#   with ResultStore("results.bin") as store:
+#       store.get("reaching", "main.entry.3")
+#
+# All strings (program points, column names, bitset universes) are in one
+# string table. The program points come first and sorted, so the dense ID of
+# a point is its position in the table, found by binary search.
+# Every column has a fixed width per point:
+#   int     one signed int (array typecode "b", "h", "i" or "q")
+#   bitset  ceil(n / 8) bytes, bit i set if the i-th name of the column's
+#           universe is in the set (the universe is a range of the string
+#           table, by default the program points themselves)
+#
+# Layout (little endian, all header words uint64, sections 8 byte aligned):
+#   MAGIC
+#   header: version, number of strings, number of points, number of columns
+#   string offsets (number of strings + 1, into the string bytes)
+#   string bytes (utf-8)
+#   column directory, per column: name string ID, kind, typecode, universe
+#     start, universe size, row width in bytes, offset of the data in the file
+#   column data: number of points * row width bytes each
+
+MAGIC = b"CS260RES"
+VERSION = 1
+INT = 0
+BITSET = 1
+_DIRECTORY_WORDS = 7
+
+
+def _align(n, alignment=8):
+    return (n + alignment - 1) // alignment * alignment
+
+
+class ResultStoreBuilder:
+    """
+    Collects columns in memory, to write() them as a ResultStore file.
+    Values for program points not in the store raise ValueError.
+    """
+    points: List[str]
+
+    def __init__(self, program_points: Iterable[str]):
+        self.points = sorted(set(program_points))
+        self.ids = {point: i for i, point in enumerate(self.points)}
+        # (name, kind, typecode, universe or None for the program points, data)
+        self.columns = []
+
+    @staticmethod
+    def for_program(program: Program) -> ResultStoreBuilder:
+        # a row for every instruction of the program
+        return ResultStoreBuilder(inst.program_point for func in program.functions
+                                  for block in func.basic_blocks.values() for inst in block.body)
+
+    def point_id(self, program_point) -> int:
+        point_id = self.ids.get(program_point)
+        if point_id is None:
+            raise ValueError(f"Program point {program_point} is not in the store")
+        return point_id
+
+    def add_int_column(self, name, values: Dict[str, int], typecode="i", default=0):
+        if typecode not in "bhiq":
+            raise ValueError(f"Int columns are signed, not {typecode}")
+        column = array(typecode, [default]) * len(self.points)
+        for point, value in values.items():
+            column[self.point_id(point)] = value
+        self.columns.append((name, INT, typecode, None, to_little_endian(column)))
+
+    def add_bitset_column(self, name, sets: Dict[str, Iterable[str]], universe: Optional[List[str]] = None):
+        # universe: the names that can be in the sets, the program points if None
+        index = self.ids if universe is None else {n: i for i, n in enumerate(universe)}
+        width = (len(index) + 7) // 8
+        data = bytearray(width * len(self.points))
+        for point, names in sets.items():
+            row = self.point_id(point) * width
+            for n in names:
+                i = index.get(n)
+                if i is None:
+                    raise ValueError(f"{n} is not in the universe of column {name}")
+                data[row + i // 8] |= 1 << (i % 8)
+        self.columns.append((name, BITSET, "B", universe, bytes(data)))
+
+    def write(self, path):
+        strings = list(self.points)
+        directory = []
+        for name, kind, typecode, universe, data in self.columns:
+            name_id = len(strings)
+            strings.append(name)
+            if universe is None:
+                universe_start, universe_size = 0, len(self.points)
+            else:
+                universe_start, universe_size = len(strings), len(universe)
+                strings.extend(universe)
+            width = len(data) // len(self.points) if self.points else 0
+            directory.append([name_id, kind, ord(typecode), universe_start, universe_size, width])
+
+        encoded = [s.encode() for s in strings]
+        offsets = array("Q", [0])
+        for s in encoded:
+            offsets.append(offsets[-1] + len(s))
+        string_bytes = b"".join(encoded)
+
+        header = array("Q", [VERSION, len(strings), len(self.points), len(self.columns)])
+        position = len(MAGIC) + 8 * len(header) + 8 * len(offsets) + _align(len(string_bytes)) \
+            + 8 * _DIRECTORY_WORDS * len(directory)
+        for entry, (_, _, _, _, data) in zip(directory, self.columns):
+            entry.append(position)
+            position += _align(len(data))
+
+        with open(path, "wb") as f:
+            f.write(MAGIC)
+            f.write(to_little_endian(header))
+            f.write(to_little_endian(offsets))
+            f.write(string_bytes.ljust(_align(len(string_bytes)), b"\0"))
+            f.write(to_little_endian(array("Q", [word for entry in directory for word in entry])))
+            for _, _, _, _, data in self.columns:
+                f.write(data.ljust(_align(len(data)), b"\0"))
+
+
+class ResultColumn:
+    name: str
+    kind: int
+    typecode: str
+    universe_start: int
+    universe_size: int
+    width: int
+    offset: int
+
+    def __init__(self, name, kind, typecode, universe_start, universe_size, width, offset):
+        self.name = name
+        self.kind = kind
+        self.typecode = typecode
+        self.universe_start = universe_start
+        self.universe_size = universe_size
+        self.width = width
+        self.offset = offset
+
+    def __repr__(self):
+        return f"<ResultColumn {self.name}>"
+
+
+class ResultStore:
+    """
+    A ResultStore file, opened read-only. Only the header and the column
+    directory are read up front; strings and rows are read from the mapping
+    when asked for.
+    """
+    num_points: int
+    columns: Dict[str, ResultColumn]
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = None
+        try:
+            self.read_directory(path)
+        except BaseException:
+            self.close()
+            raise
+
+    def read_directory(self, path):
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file can't be mapped
+            raise ValueError(f"{path} is not a result store")
+        size = len(self.data)
+
+        def check(end):
+            # everything read below must be in the file, which may be cut short
+            if end > size:
+                raise ValueError(f"{path} is truncated")
+
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a result store")
+        check(len(MAGIC) + 8 * 4)
+        version, self.num_strings, self.num_points, num_columns = struct.unpack_from("<4Q", self.data, len(MAGIC))
+        if version != VERSION:
+            raise ValueError(f"Unsupported result store version {version}")
+        self.offsets_start = len(MAGIC) + 8 * 4
+        self.strings_start = self.offsets_start + 8 * (self.num_strings + 1)
+        check(self.strings_start)
+        strings_size = struct.unpack_from("<Q", self.data, self.strings_start - 8)[0]
+        directory_start = self.strings_start + _align(strings_size)
+        check(directory_start + 8 * _DIRECTORY_WORDS * num_columns)
+
+        self.columns = {}
+        for i in range(num_columns):
+            name_id, kind, typecode, universe_start, universe_size, width, offset = \
+                struct.unpack_from(f"<{_DIRECTORY_WORDS}Q", self.data, directory_start + 8 * _DIRECTORY_WORDS * i)
+            if name_id >= self.num_strings or universe_start + universe_size > self.num_strings:
+                raise ValueError(f"{path} is not a result store")
+            check(offset + width * self.num_points)
+            name = self.string(name_id)
+            self.columns[name] = ResultColumn(name, kind, chr(typecode), universe_start, universe_size, width, offset)
+
+    def close(self):
+        if getattr(self, "data", None) is not None:
+            self.data.close()
+            self.data = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.num_points
+
+    def string_bytes(self, string_id) -> bytes:
+        start, end = struct.unpack_from("<2Q", self.data, self.offsets_start + 8 * string_id)
+        return self.data[self.strings_start + start:self.strings_start + end]
+
+    def string(self, string_id) -> str:
+        return self.string_bytes(string_id).decode()
+
+    def point(self, point_id) -> str:
+        return self.string(point_id)
+
+    def point_id(self, program_point) -> int:
+        # utf-8 bytes sort like the strings they encode, so search the raw bytes
+        key = program_point.encode()
+        lo, hi = 0, self.num_points
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.string_bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.num_points or self.string_bytes(lo) != key:
+            raise ValueError(f"Program point {program_point} is not in the store")
+        return lo
+
+    def column(self, name) -> ResultColumn:
+        column = self.columns.get(name)
+        if column is None:
+            raise ValueError(f"No column {name}")
+        return column
+
+    def row(self, name, point_id):
+        # the value of a column at a point ID: an int, or a set of names
+        column = self.column(name)
+        start = column.offset + column.width * point_id
+        if column.kind == INT:
+            return struct.unpack_from(f"<{column.typecode}", self.data, start)[0]
+        return {self.string(column.universe_start + i) for i in self.bit_indices(column, point_id)}
+
+    def bits(self, name, program_point) -> int:
+        # a bitset as an int (bit i for the i-th name of the universe), for cheap set operations
+        column = self.column(name)
+        if column.kind != BITSET:
+            raise ValueError(f"Column {name} is not a bitset")
+        start = column.offset + column.width * self.point_id(program_point)
+        return int.from_bytes(self.data[start:start + column.width], "little")
+
+    def bit_indices(self, column: ResultColumn, point_id) -> List[int]:
+        start = column.offset + column.width * point_id
+        indices = []
+        for i, byte in enumerate(self.data[start:start + column.width]):
+            while byte:
+                low = byte & -byte
+                indices.append(8 * i + low.bit_length() - 1)
+                byte ^= low
+        return indices
+
+    def get(self, name, program_point):
+        return self.row(name, self.point_id(program_point))
+
+    def facts(self, program_point) -> Dict[str, object]:
+        # every column at a program point, e.g. facts(inst.program_point)
+        point_id = self.point_id(program_point)
+        return {name: self.row(name, point_id) for name in self.columns}
+
+    def int_column(self, name) -> array:
+        # a whole int column, indexed by point ID
+        column = self.column(name)
+        if column.kind != INT:
+            raise ValueError(f"Column {name} is not an int column")
+        end = column.offset + column.width * self.num_points
+        return from_little_endian(column.typecode, self.data[column.offset:end])
+
+
+def main():
+    import argparse
+    import json
+
+    arg_parser = argparse.ArgumentParser(description="Print the results stored for program points")
+    arg_parser.add_argument("store", help="path of the result store")
+    arg_parser.add_argument("program_points", nargs="*", help="program points to print (default: list the columns)")
+    args = arg_parser.parse_args()
+    with ResultStore(args.store) as store:
+        if not args.program_points:
+            print(f"{len(store)} program points")
+            for column in store.columns.values():
+                print(f"{column.name}: {'int' if column.kind == INT else 'bitset'}")
+        for point in args.program_points:
+            facts = {name: sorted(value) if isinstance(value, set) else value
+                     for name, value in store.facts(point).items()}
+            print(json.dumps({"program_point": point, **facts}))
+
+
+if __name__ == "__main__":
+    main()
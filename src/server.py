@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import socket
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+from .parser import Parser
+from .set_constraints import SetConstraints
+
+# A long-running server that keeps parsed Programs (and answers computed from
+# them) warm, so short queries don't pay for starting Python and re-parsing.
+#
+# Start it with (from the root directory):
+#   python3 -m src.server /tmp/cs260.sock
+#
+# The protocol is newline-delimited JSON over a Unix socket. Each line is a
+# request, or a list of requests (a batch), and gets back a line with the
+# response, or the list of responses:
+#   {"id": 1, "method": "get_inst", "path": "foo.ir", "program_point": "main.entry.0"}
+#   {"id": 1, "result": "x:int = $copy 0"}
+# Failures give {"id": ..., "error": "..."} instead of a result.
+#
+# Methods (all take "path"):
+#   functions        name, type, parameters and address_taken of every function
+#   get_inst         the instruction at "program_point", as ir text
+#   output           the whole program, as ir text
+#   set_constraints  the file parsed as set constraints, dumped with to_text
+#   stats            cache sizes and hit counts (no "path" needed)
+#
+# Files are cached by the hash of their contents, so all clients share the
+# parsed programs, and an edited file is simply a new entry.
+
+
+class LRUCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        if key not in self.entries:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class AnalysisServer:
+    programs: LRUCache
+    set_constraints: LRUCache
+    results: LRUCache
+
+    def __init__(self, cache_size=16, result_cache_size=4096):
+        # hash -> parsed Program / SetConstraints
+        self.programs = LRUCache(cache_size)
+        self.set_constraints = LRUCache(cache_size)
+        # (hash, method, args) -> result
+        self.results = LRUCache(result_cache_size)
+        # path -> (mtime, size, hash), to avoid re-reading unchanged files
+        self.file_hashes = {}
+        self.texts = LRUCache(cache_size)
+
+    def file_hash(self, path) -> str:
+        stat = os.stat(path)
+        known = self.file_hashes.get(path)
+        if known is not None and known[:2] == (stat.st_mtime_ns, stat.st_size):
+            return known[2]
+        with open(path, "r") as f:
+            text = f.read()
+        digest = hashlib.sha256(text.encode()).hexdigest()
+        self.file_hashes[path] = (stat.st_mtime_ns, stat.st_size, digest)
+        self.texts.put(digest, text)
+        return digest
+
+    def file_text(self, path, digest) -> str:
+        text = self.texts.get(digest)
+        if text is None:
+            with open(path, "r") as f:
+                text = f.read()
+            self.texts.put(digest, text)
+        return text
+
+    def get_program(self, path, digest):
+        program = self.programs.get(digest)
+        if program is None:
+            program = Parser(self.file_text(path, digest), lazy=True).parse_program()
+            self.programs.put(digest, program)
+        return program
+
+    def get_set_constraints(self, path, digest):
+        set_constraints = self.set_constraints.get(digest)
+        if set_constraints is None:
+            set_constraints = SetConstraints.parse(self.file_text(path, digest))
+            self.set_constraints.put(digest, set_constraints)
+        return set_constraints
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        if not isinstance(request, dict):
+            return {"id": None, "error": f"Request must be an object, not {json.dumps(request)}"}
+        response = {"id": request.get("id")}
+        try:
+            response["result"] = self.dispatch(request)
+        except Exception as e:
+            response["error"] = f"{type(e).__name__}: {e}"
+        return response
+
+    def handle_line(self, line: str) -> str:
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            return json.dumps({"id": None, "error": f"Invalid JSON: {e}"})
+        if isinstance(request, list):
+            return json.dumps([self.handle(r) for r in request])
+        return json.dumps(self.handle(request))
+
+    def dispatch(self, request: Dict[str, Any]):
+        method = request.get("method")
+        if method == "stats":
+            return {name: {"size": len(cache), "hits": cache.hits, "misses": cache.misses}
+                    for name, cache in [("programs", self.programs), ("set_constraints", self.set_constraints),
+                                        ("results", self.results)]}
+        if method not in ("functions", "get_inst", "output", "set_constraints"):
+            raise ValueError(f"Unknown method {method}")
+
+        path = request["path"]
+        digest = self.file_hash(path)
+        key = (digest, method, request.get("program_point"))
+        result = self.results.get(key)
+        if result is not None:
+            return result
+
+        if method == "set_constraints":
+            result = self.get_set_constraints(path, digest).to_text()
+        else:
+            program = self.get_program(path, digest)
+            if method == "functions":
+                result = [{"name": func.name,
+                           "type": str(func.type),
+                           "parameters": [param.output() for param in func.parameters],
+                           "address_taken": func.address_taken} for func in program.functions]
+            elif method == "get_inst":
+                result = program.get_inst(request["program_point"]).output()
+            else:
+                result = program.output()
+        self.results.put(key, result)
+        return result
+
+    async def serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                writer.write(self.handle_line(line.decode()).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = await asyncio.start_unix_server(self.serve_client, path=socket_path, limit=2 ** 24)
+        async with server:
+            await server.serve_forever()
+
+
+class Client:
+    """
+    Blocking client for AnalysisServer:
+
+    with Client("/tmp/cs260.sock") as client:
+        insts = client.batch([{"method": "get_inst", "path": "foo.ir", "program_point": p} for p in points])
+    """
+
+    def __init__(self, socket_path):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(socket_path)
+        self.file = self.socket.makefile("rwb")
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def send(self, request):
+        self.file.write(json.dumps(request).encode() + b"\n")
+        self.file.flush()
+        return json.loads(self.file.readline())
+
+    def request(self, method, **params):
+        # a single request, raising on errors
+        response = self.send({"method": method, **params})
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    def batch(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self.send(requests)
+
+
+def main():
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Keep parsed programs warm behind a Unix socket")
+    arg_parser.add_argument("socket", help="path of the Unix socket to listen on")
+    arg_parser.add_argument("--cache-size", type=int, default=16, help="number of parsed files to keep")
+    args = arg_parser.parse_args()
+    try:
+        asyncio.run(AnalysisServer(cache_size=args.cache_size).serve(args.socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
 from __future__ import annotations
 
+import array
+import gc
+import io
 import re
+from .binary import from_little_endian, to_little_endian
 from .ir import *
 
 
@@ -8,6 +12,12 @@ class SetVariable:
     def __init__(self, name: str):
         self.name = name
         self.projections = set()
+        # filled in by SetConstraints.solve, see there
+        self.lower_bounds = set()
+        self.upper_bounds = set()
+        self.successors = set()
+        self.proj_uppers = set()
+        self.proj_lowers = set()
 
     def __str__(self):
         return self.name
@@ -44,10 +54,14 @@ class Proj:
         self.constructor = constructor
         self.var = var
         self.index = index
+        self.text = None
         var.projections.add(self)
 
     def __str__(self):
-        return f"proj({self.constructor}, {self.var}, {self.index})"
+        # terms never change, so each is rendered once (and hashed by that)
+        if self.text is None:
+            self.text = f"proj({self.constructor}, {self.var}, {self.index})"
+        return self.text
 
     def __hash__(self):
         return hash(str(self))
@@ -60,12 +74,17 @@ class Call:
     def __init__(self, constructor: Constructor, args: List[Union[SetVariable, Call, Proj]]):
         self.constructor = constructor
         self.args = args
+        self.text = None
         constructor.calls.add(self)
 
     def __str__(self):
-        if len(self.args) == 0:
-            return f"call({self.constructor})"
-        return f"call({self.constructor}, {', '.join(map(str, self.args))})"
+        # rendered once, reusing the renderings of the arguments
+        if self.text is None:
+            if len(self.args) == 0:
+                self.text = f"call({self.constructor})"
+            else:
+                self.text = f"call({self.constructor}, {', '.join(map(str, self.args))})"
+        return self.text
 
     def __hash__(self):
         return hash(str(self))
@@ -83,11 +102,42 @@ class Constraint:
         return f"{self.left} <= {self.right}"
 
 
+# Binary format, written by write_binary (all integers are little endian uint32):
+#   BINARY_MAGIC
+#   header: version, size of the name table in bytes, number of constructors,
+#           number of constructor words, number of set variables, number of
+#           term words, number of constraints
+#   name table: utf-8 names of the constructors then of the set variables,
+#               separated by newlines
+#   constructor words: per constructor, arity, number of contravariant
+#                      positions, the positions
+#   term words: calls and projections, as
+#               _CALL, constructor id, number of args, arg term ids... or
+#               _PROJ, constructor id, set variable term id, index
+#   constraints: left term id, right term id
+# Set variables are terms 0..n-1 (in table order) and the term words define
+# terms n, n+1, ..., each only referring to earlier ones.
+BINARY_MAGIC = b"SETC"
+BINARY_VERSION = 1
+_CALL = 0
+_PROJ = 1
+
+
 class SetConstraints:
     def __init__(self):
         self.constructors = []
         self.set_variables = []
         self.constraints = []
+        # name -> Constructor / SetVariable, so lookups don't scan the lists
+        self.constructor_table = {}
+        self.set_variable_table = {}
+        # solver state, see solve()
+        self.solved = False
+        self.errors = []
+        # (call, call) pairs already decomposed
+        self.call_pairs = set()
+        # undo log of (function, args...) while a snapshot is open, else None
+        self.trail = None
 
     @staticmethod
     def parse(text):
@@ -120,14 +170,31 @@ class SetConstraints:
         name = match.group(1)
         arity = int(match.group(2))
         contravariant_positions = [int(x) for x in match.group(3).split()]
-        self.constructors.append(Constructor(name, arity, contravariant_positions))
+        constructor = Constructor(name, arity, contravariant_positions)
+        self.constructors.append(constructor)
+        self.record(self.constructors.pop)
+        if name not in self.constructor_table:
+            self.constructor_table[name] = constructor
+            self.record(self.constructor_table.pop, name)
 
     def add_parsed_constraint(self, line):
         match = re.match(r"(.*) <= (.*)", line)
         assert match is not None
         left = self.parse_expression(match.group(1))
         right = self.parse_expression(match.group(2))
-        self.constraints.append(Constraint(left, right))
+        self.add_constraint(left, right)
+
+    def add_constraint(self, left, right):
+        """
+        Add `left <= right`. Once solved, only the consequences of the new
+        constraint are propagated through the already closed graph.
+        """
+        constraint = Constraint(left, right)
+        self.constraints.append(constraint)
+        self.record(self.constraints.pop)
+        if self.solved:
+            self.propagate(left, right)
+        return constraint
 
     def parse_expression(self, text):
         text = text.strip()
@@ -144,7 +211,7 @@ class SetConstraints:
         assert match is not None
         constructor = self.get_constructor(match.group(1))
         if match.group(2) is None:
-            return Call(constructor, [])
+            return self.new_call(constructor, [])
         raw_args = match.group(2)
         depth = 0
         last = 0
@@ -159,7 +226,7 @@ class SetConstraints:
                 args.append(self.parse_expression(arg))
                 last = i + 1
         args.append(self.parse_expression(raw_args[last:]))
-        return Call(constructor, args)
+        return self.new_call(constructor, args)
 
     def parse_proj(self, text):
         text = text.strip()
@@ -168,27 +235,289 @@ class SetConstraints:
         constructor = self.get_constructor(match.group(1))
         var = self.get_set_variable(match.group(2))
         index = int(match.group(3))
-        return Proj(constructor, var, index)
+        projections = var.projections
+        size = len(projections)
+        proj = Proj(constructor, var, index)
+        if len(projections) > size:
+            self.record(projections.discard, proj)
+        return proj
+
+    def new_call(self, constructor, args):
+        # a Call, whose registration in constructor.calls is undone on rollback
+        calls = constructor.calls
+        size = len(calls)
+        call = Call(constructor, args)
+        if len(calls) > size:
+            self.record(calls.discard, call)
+        return call
 
     def get_constructor(self, name):
-        name = name.strip()
-        for constructor in self.constructors:
-            if constructor.name == name:
-                return constructor
-        return None
+        return self.constructor_table.get(name.strip())
 
     def get_set_variable(self, name):
         name = name.strip()
-        for set_variable in self.set_variables:
-            if set_variable.name == name:
-                return set_variable
+        var = self.set_variable_table.get(name)
+        if var is not None:
+            return var
         var = SetVariable(name)
         self.set_variables.append(var)
+        self.set_variable_table[name] = var
+        self.record(self.set_variables.pop)
+        self.record(self.set_variable_table.pop, name)
         return var
 
     def to_text(self):
-        s = ""
-        s += "\n".join(sorted(c.as_def() for c in self.constructors)) + "\n"
-        s += "\n".join(sorted(set(str(c) for c in self.constraints))) + "\n"
-        return s
+        out = io.StringIO()
+        self.write_text(out)
+        return out.getvalue()
+
+    def write_text(self, file, batch_size=4096):
+        """
+        Write what to_text returns to a text file, a batch of lines at a time,
+        without building the whole output. The constraints are sorted (and
+        deduplicated) by the renderings of their sides, which every term
+        keeps, so no line exists before it is written.
+        """
+        file.write("\n".join(sorted(c.as_def() for c in self.constructors)) + "\n")
+        # terms are rendered without spaces before a " <= ", so this is the
+        # order of the whole lines
+        sides = sorted({(str(c.left), str(c.right)) for c in self.constraints})
+        if not sides:
+            file.write("\n")
+        for start in range(0, len(sides), batch_size):
+            file.write("".join(f"{left} <= {right}\n" for left, right in sides[start:start + batch_size]))
+
+    def write_binary(self, file):
+        """
+        Write the constructors, set variables and constraints to a binary
+        file, in the format described at BINARY_MAGIC. Read back with
+        SetConstraints.read_binary.
+        """
+        # a constructor's ID is its position in self.constructors (for a name
+        # defined twice, terms use the first definition, as parse does)
+        positions = {id(constructor): i for i, constructor in enumerate(self.constructors)}
+
+        def constructor_id(constructor):
+            position = positions.get(id(constructor))
+            if position is None:
+                position = positions[id(self.constructor_table[constructor.name])]
+            return position
+        # term ids: set variables first, then calls and projections, each
+        # after its arguments, and equal terms share an id
+        term_ids = {}
+        for var in self.set_variables:
+            term_ids.setdefault(var, len(term_ids))
+        num_variables = len(term_ids)
+        terms = array.array("I")
+
+        def term_id(term):
+            known = term_ids.get(term)
+            if known is not None:
+                return known
+            if isinstance(term, SetVariable):
+                raise ValueError(f"Unknown set variable {term}")
+            if isinstance(term, Proj):
+                words = [_PROJ, constructor_id(term.constructor), term_id(term.var), term.index]
+            else:
+                words = [_CALL, constructor_id(term.constructor), len(term.args)]
+                words += [term_id(arg) for arg in term.args]
+            terms.extend(words)
+            term_ids[term] = len(term_ids)
+            return term_ids[term]
+
+        constraints = array.array("I")
+        for constraint in self.constraints:
+            constraints.append(term_id(constraint.left))
+            constraints.append(term_id(constraint.right))
+
+        constructors = array.array("I")
+        for constructor in self.constructors:
+            constructors.append(constructor.arity)
+            constructors.append(len(constructor.contravariant_positions))
+            constructors.extend(constructor.contravariant_positions)
+        names = "\n".join([c.name for c in self.constructors] + [v.name for v in self.set_variables]).encode()
+
+        header = array.array("I", [BINARY_VERSION, len(names), len(self.constructors), len(constructors),
+                                   num_variables, len(terms), len(constraints) // 2])
+        file.write(BINARY_MAGIC)
+        file.write(to_little_endian(header))
+        file.write(names)
+        for words in (constructors, terms, constraints):
+            file.write(to_little_endian(words))
 
+    @staticmethod
+    def read_binary(file):
+        # nothing built here is garbage yet, so don't let the collector
+        # repeatedly walk the millions of new objects
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return SetConstraints._read_binary(file.read())
+        finally:
+            if enabled:
+                gc.enable()
+
+    @staticmethod
+    def _read_binary(data):
+        if data[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+            raise ValueError("Not a binary set constraint file")
+        pos = len(BINARY_MAGIC)
+
+        def words(n):
+            nonlocal pos
+            result = from_little_endian("I", data[pos:pos + 4 * n])
+            pos += 4 * n
+            return result
+
+        version, names_size, num_constructors, constructor_words, num_variables, term_words, num_constraints = words(7)
+        if version != BINARY_VERSION:
+            raise ValueError(f"Unsupported binary set constraint version {version}")
+        names = data[pos:pos + names_size].decode().split("\n") if names_size else []
+        pos += names_size
+
+        set_constraints = SetConstraints()
+        constructor_table = words(constructor_words)
+        i = 0
+        for name in names[:num_constructors]:
+            arity, num_contravariant = constructor_table[i], constructor_table[i + 1]
+            contravariant_positions = constructor_table[i + 2:i + 2 + num_contravariant].tolist()
+            i += 2 + num_contravariant
+            constructor = Constructor(name, arity, contravariant_positions)
+            set_constraints.constructors.append(constructor)
+            set_constraints.constructor_table.setdefault(name, constructor)
+        constructors = set_constraints.constructors
+
+        terms = []
+        for name in names[num_constructors:num_constructors + num_variables]:
+            var = SetVariable(name)
+            set_constraints.set_variables.append(var)
+            set_constraints.set_variable_table[name] = var
+            terms.append(var)
+        term_table = words(term_words).tolist()
+        i = 0
+        while i < term_words:
+            if term_table[i] == _CALL:
+                num_args = term_table[i + 2]
+                terms.append(Call(constructors[term_table[i + 1]],
+                                  [terms[t] for t in term_table[i + 3:i + 3 + num_args]]))
+                i += 3 + num_args
+            else:
+                terms.append(Proj(constructors[term_table[i + 1]], terms[term_table[i + 2]], term_table[i + 3]))
+                i += 4
+
+        constraint_table = words(2 * num_constraints).tolist()
+        set_constraints.constraints = [Constraint(terms[constraint_table[j]], terms[constraint_table[j + 1]])
+                                       for j in range(0, len(constraint_table), 2)]
+        return set_constraints
+
+    def solve(self):
+        """
+        Close the constraints, after which add_constraint is incremental.
+
+        Every variable X keeps:
+        lower_bounds  calls c(...) <= X, closed under the rules below
+        upper_bounds  calls X <= c(...)
+        successors    variables X <= Y
+        proj_uppers   (c, i, T) for proj(c, X, i) <= T
+        proj_lowers   (c, i, T) for T <= proj(c, X, i)
+        and each call reaching X is sent through all of them: to the upper
+        bound calls (matching constructors and decomposing the arguments,
+        swapping contravariant ones), to the successors, and into the
+        projections. Each pair of calls c(...) <= d(...) is only handled the
+        first time it comes up (see `call_pairs`), and those of different
+        constructors are collected in `errors`, once each.
+        """
+        if self.solved:
+            return
+        self.solved = True
+        self.record(setattr, self, "solved", False)
+        for constraint in list(self.constraints):
+            self.propagate(constraint.left, constraint.right)
+
+    def solution(self, var):
+        # the calls that make up the least solution of a variable (or its name)
+        if not isinstance(var, SetVariable):
+            var = self.get_set_variable(var)
+        return set(var.lower_bounds)
+
+    def propagate(self, left, right):
+        work = [(left, right)]
+        while work:
+            left, right = work.pop()
+            if isinstance(left, Proj):
+                entry = (left.constructor.name, left.index, right)
+                if self.add_to(left.var.proj_uppers, entry):
+                    for call in left.var.lower_bounds:
+                        if call.constructor.name == entry[0] and left.index < len(call.args):
+                            work.append((call.args[left.index], right))
+            elif isinstance(right, Proj):
+                entry = (right.constructor.name, right.index, left)
+                if self.add_to(right.var.proj_lowers, entry):
+                    for call in right.var.lower_bounds:
+                        if call.constructor.name == entry[0] and right.index < len(call.args):
+                            work.append((left, call.args[right.index]))
+            elif isinstance(left, SetVariable):
+                if left is right:
+                    continue
+                bounds = left.successors if isinstance(right, SetVariable) else left.upper_bounds
+                if self.add_to(bounds, right):
+                    for call in left.lower_bounds:
+                        work.append((call, right))
+            elif isinstance(right, SetVariable):
+                if self.add_to(right.lower_bounds, left):
+                    for upper in right.upper_bounds:
+                        work.append((left, upper))
+                    for successor in right.successors:
+                        work.append((left, successor))
+                    name = left.constructor.name
+                    for constructor, index, upper in right.proj_uppers:
+                        if constructor == name and index < len(left.args):
+                            work.append((left.args[index], upper))
+                    for constructor, index, lower in right.proj_lowers:
+                        if constructor == name and index < len(left.args):
+                            work.append((lower, left.args[index]))
+            elif not self.add_to(self.call_pairs, (left, right)):
+                # reached again along another path, already decomposed
+                continue
+            elif left.constructor.name != right.constructor.name or len(left.args) != len(right.args):
+                self.errors.append(Constraint(left, right))
+                self.record(self.errors.pop)
+            else:
+                contravariant = left.constructor.contravariant_positions
+                for i, (left_arg, right_arg) in enumerate(zip(left.args, right.args)):
+                    if i in contravariant:
+                        work.append((right_arg, left_arg))
+                    else:
+                        work.append((left_arg, right_arg))
+
+    def add_to(self, bounds, item):
+        if item in bounds:
+            return False
+        bounds.add(item)
+        self.record(bounds.discard, item)
+        return True
+
+    def record(self, undo, *args):
+        if self.trail is not None:
+            self.trail.append((undo, args))
+
+    def snapshot(self):
+        """
+        Start recording changes, returning a handle to rollback() to, e.g.
+        to add speculative constraints and then forget them again.
+        """
+        if self.trail is None:
+            self.trail = []
+        return len(self.trail)
+
+    def rollback(self, snapshot):
+        # undo everything added since the snapshot (constraints, variables, solver state)
+        if self.trail is None:
+            raise ValueError("No snapshot to roll back to, commit() has invalidated them")
+        while len(self.trail) > snapshot:
+            undo, args = self.trail.pop()
+            undo(*args)
+
+    def commit(self):
+        # keep everything and stop recording, invalidating all snapshots
+        self.trail = None
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+from .cfg import *
+
+
+class Simplification:
+    """
+    How the program points of a function moved during simplify_cfg.
+
+    `mapping` maps every original program point to its new program point, or
+    None if the instruction was removed (e.g. a jump between merged blocks).
+    `origins` maps every new program point back to the original ones, so
+    results computed on the simplified function can be reported against the
+    original program.
+    """
+    mapping: Dict[str, Optional[str]]
+    origins: Dict[str, List[str]]
+
+    def __init__(self, mapping):
+        self.mapping = mapping
+        self.origins = {}
+        for old, new in mapping.items():
+            if new is not None:
+                self.origins.setdefault(new, []).append(old)
+
+
+def simplify_cfg(func: Function) -> Simplification:
+    """
+    Shrink the CFG of `func` in place, until nothing changes:
+    - branches on a constant, or to the same label twice, become jumps
+    - blocks unreachable from the entry are removed
+    - jumps to blocks that only jump elsewhere go straight there
+    - a block jumping to a block with no other predecessors absorbs it
+    Blocks keep their labels, and instructions keep their order within them.
+    """
+    old_points = [(inst, inst.program_point) for block in func.basic_blocks.values() for inst in block.body]
+    replaced = {}  # old instruction -> the instruction it became
+
+    changed = True
+    while changed:
+        changed = False
+        changed |= _fold_branches(func, replaced)
+        changed |= _remove_unreachable(func)
+        changed |= _thread_jumps(func)
+        changed |= _merge_blocks(func)
+
+    alive = {id(inst) for block in func.basic_blocks.values() for inst in block.body}
+    mapping = {}
+    for inst, point in old_points:
+        while inst in replaced:
+            inst = replaced[inst]
+        mapping[point] = inst.program_point if id(inst) in alive else None
+    return Simplification(mapping)
+
+
+def _rebuild(func: Function):
+    # re-resolve every label after blocks were changed or removed
+    func.set_basic_blocks(list(func.basic_blocks.values()))
+
+
+def _phis(block: BasicBlock) -> List[PhiInst]:
+    return [inst for inst in block.body if isinstance(inst, PhiInst)]
+
+
+def _drop_incoming(block: BasicBlock, pred: BasicBlock):
+    # pred no longer flows into block
+    for phi in _phis(block):
+        if phi.incoming is None:
+            continue
+        keep = [i for i, b in enumerate(phi.incoming) if b is not pred]
+        phi.ops = [phi.ops[i] for i in keep]
+        phi.incoming = [phi.incoming[i] for i in keep]
+
+
+def _fold_branches(func: Function, replaced) -> bool:
+    changed = False
+    for block in func.basic_blocks.values():
+        branch = block.terminal
+        if not isinstance(branch, BranchInst):
+            continue
+        if branch.label_true == branch.label_false:
+            label = branch.label_true
+        elif isinstance(branch.condition, ConstIntOperand):
+            if branch.condition.value != 0:
+                label, dropped = branch.label_true, branch.target_false
+            else:
+                label, dropped = branch.label_false, branch.target_true
+            if dropped is not None:
+                _drop_incoming(dropped, block)
+        else:
+            continue
+        jump = JumpInst(label)
+        replaced[branch] = jump
+        block.set_body(block.body[:-1] + [jump])
+        changed = True
+    if changed:
+        _rebuild(func)
+    return changed
+
+
+def _remove_unreachable(func: Function) -> bool:
+    reachable = {block.label for block in reverse_postorder(func)}
+    if func.entry is None or len(reachable) == len(func.basic_blocks):
+        return False
+    removed = [block for block in func.basic_blocks.values() if block.label not in reachable]
+    for block in removed:
+        for succ in successors(block):
+            _drop_incoming(succ, block)
+    func.basic_blocks = {label: block for label, block in func.basic_blocks.items() if label in reachable}
+    _rebuild(func)
+    return True
+
+
+def _thread_jumps(func: Function) -> bool:
+    changed = False
+    # trivial block label -> the label it forwards to, following chains
+    forward = {}
+    for block in func.basic_blocks.values():
+        if block is not func.entry and len(block.body) == 1 and isinstance(block.terminal, JumpInst):
+            target = block.terminal.target
+            if target is not None and target is not block and not _phis(target):
+                forward[block.label] = target.label
+
+    def final(label):
+        seen = set()
+        while label in forward and label not in seen:
+            seen.add(label)
+            label = forward[label]
+        return label
+
+    for block in func.basic_blocks.values():
+        terminal = block.terminal
+        if isinstance(terminal, JumpInst):
+            label = final(terminal.label)
+            if label != terminal.label and label != block.label:
+                terminal.label = label
+                changed = True
+        elif isinstance(terminal, BranchInst):
+            label_true, label_false = final(terminal.label_true), final(terminal.label_false)
+            if (label_true, label_false) != (terminal.label_true, terminal.label_false):
+                terminal.label_true, terminal.label_false = label_true, label_false
+                changed = True
+    if changed:
+        _rebuild(func)
+    return changed
+
+
+def _merge_blocks(func: Function) -> bool:
+    changed = False
+    preds = predecessors(func)
+    for block in list(func.basic_blocks.values()):
+        if block.label not in func.basic_blocks:
+            continue  # merged into an earlier block already
+        # absorb the chain of blocks following this one
+        while isinstance(block.terminal, JumpInst):
+            succ = block.terminal.target
+            if succ is None or succ is block or succ is func.entry:
+                break
+            if len(preds[succ.label]) != 1 or _phis(succ):
+                break
+            block.set_body(block.body[:-1] + succ.body)
+            del func.basic_blocks[succ.label]
+            for next_block in successors(succ):
+                preds[next_block.label] = [block if p is succ else p for p in preds[next_block.label]]
+                for phi in _phis(next_block):
+                    if phi.incoming is not None:
+                        phi.incoming = [block if b is succ else b for b in phi.incoming]
+            changed = True
+    if changed:
+        _rebuild(func)
+    return changed
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+from .cfg import *
+
+
+def construct_ssa(func: Function, pruned: bool = True) -> Dict[str, str]:
+    """
+    Rewrite `func` into SSA form, in place.
+
+    Phis are placed on the iterated dominance frontier of each variable's
+    definitions (Cytron et al.). With `pruned`, a phi is only placed where the
+    variable is live, otherwise every frontier gets one (minimal SSA).
+
+    Every definition gets a fresh versioned variable "<name>.<n>". Parameters
+    keep their names, and uses with no reaching definition keep the original
+    variable. Each inserted PhiInst has one op per predecessor, with the
+    predecessor recorded in `incoming`. Unreachable blocks are left alone.
+    Variables whose address is taken live in memory, so they are left as
+    they are (no phis, no versions).
+
+    Returns a map from each new variable name to its original name.
+    """
+    dom_tree = DominatorTree(func)
+    order = dom_tree.order
+    if not order:
+        return {}
+    if dom_tree.preds[order[0].label]:
+        raise ValueError(f"Entry block of {func.name} has predecessors")
+    for block in order:
+        for inst in block.body:
+            if isinstance(inst, PhiInst):
+                raise ValueError(f"{inst.program_point} is already a phi")
+
+    # where is each variable defined, and with what type
+    in_memory = address_taken_variables(func)
+    def_blocks = {}
+    var_types = {}
+    for param in func.parameters:
+        if param.name in in_memory:
+            continue
+        def_blocks[param.name] = [order[0]]
+        var_types[param.name] = param.type
+    used_names = set(var_types) | in_memory
+    for block in func.basic_blocks.values():
+        for inst in block.body:
+            lhs = getattr(inst, "lhs", None)
+            if lhs is not None:
+                used_names.add(lhs.name)
+            for op in inst.operands():
+                if isinstance(op, VarOperand):
+                    used_names.add(op.variable.name)
+    for block in order:
+        for inst in block.body:
+            lhs = getattr(inst, "lhs", None)
+            if lhs is None or lhs.name in in_memory:
+                continue
+            var_types.setdefault(lhs.name, lhs.type)
+            blocks = def_blocks.setdefault(lhs.name, [])
+            if not blocks or blocks[-1] is not block:
+                blocks.append(block)
+
+    live_in = _live_in(order, dom_tree.preds) if pruned else None
+
+    # place phis
+    frontiers = dom_tree.frontiers()
+    phis = {block.label: [] for block in order}  # label -> [(original name, phi)]
+    for name, blocks in def_blocks.items():
+        has_phi = set()
+        worklist = list(blocks)
+        while worklist:
+            block = worklist.pop()
+            for frontier in frontiers[block.label]:
+                if frontier.label in has_phi:
+                    continue
+                has_phi.add(frontier.label)
+                if live_in is not None and name not in live_in[frontier.label]:
+                    continue
+                preds = dom_tree.preds[frontier.label]
+                phi = PhiInst(Variable(name, var_types[name]), [None] * len(preds), list(preds))
+                phis[frontier.label].append((name, phi))
+                if all(b is not frontier for b in blocks):
+                    worklist.append(frontier)
+    for block in order:
+        if phis[block.label]:
+            block.set_body([phi for _, phi in phis[block.label]] + block.body)
+
+    # rename
+    versions = {}
+    counters = {}
+
+    def new_version(name):
+        n = counters.get(name, 0)
+        while True:
+            n += 1
+            version = f"{name}.{n}"
+            if version not in used_names:
+                break
+        counters[name] = n
+        used_names.add(version)
+        versions[version] = name
+        return Variable(version, var_types[name])
+
+    stacks = {name: [] for name in def_blocks}
+    for param in func.parameters:
+        if param.name in stacks:
+            stacks[param.name].append(param)
+
+    def current(name):
+        stack = stacks.get(name)
+        if stack:
+            return stack[-1]
+        return None
+
+    # explicit stack instead of recursion, function bodies can be deep
+    todo = [(order[0], False)]
+    while todo:
+        block, leaving = todo.pop()
+        if leaving:
+            for inst in reversed(block.body):
+                lhs = getattr(inst, "lhs", None)
+                if lhs is not None and lhs.name in versions:
+                    stacks[versions[lhs.name]].pop()
+            continue
+
+        for inst in block.body:
+            if not isinstance(inst, PhiInst):
+                for op in inst.operands():
+                    if isinstance(op, VarOperand):
+                        var = current(op.variable.name)
+                        if var is not None:
+                            op.variable = var
+            lhs = getattr(inst, "lhs", None)
+            if lhs is not None and lhs.name in stacks:
+                var = new_version(lhs.name)
+                stacks[lhs.name].append(var)
+                inst.lhs = var
+
+        for succ in successors(block):
+            index = dom_tree.preds[succ.label].index(block)
+            for name, phi in phis[succ.label]:
+                var = current(name)
+                if var is None:
+                    var = Variable(name, var_types[name])
+                phi.ops[index] = VarOperand(var)
+
+        todo.append((block, True))
+        for child in reversed(dom_tree.children[block.label]):
+            todo.append((child, False))
+
+    return versions
+
+
+def destruct_ssa(func: Function):
+    """
+    Lower every PhiInst in `func` (which must have `incoming` set) into
+    CopyInsts at the end of its predecessors, in place. Critical edges are
+    split first, so the copies only run on the edge into the phi's block.
+    """
+    for block in list(func.basic_blocks.values()):
+        phis = [inst for inst in block.body if isinstance(inst, PhiInst)]
+        if not phis:
+            continue
+        incoming = phis[0].incoming
+        if incoming is None:
+            raise ValueError(f"{phis[0].program_point} has no incoming blocks")
+
+        for index, pred in enumerate(incoming):
+            if len(successors(pred)) > 1:
+                pred = _split_edge(func, pred, block)
+            copies = [(phi.lhs, phi.ops[index]) for phi in phis]
+            pred.set_body(pred.body[:-1] + _sequentialize(func, copies) + [pred.terminal])
+
+        block.set_body([inst for inst in block.body if not isinstance(inst, PhiInst)])
+
+
+def _live_in(order: List[BasicBlock], preds: Dict[str, List[BasicBlock]]) -> Dict[str, Set[str]]:
+    uses = {}
+    defs = {}
+    for block in order:
+        block_uses = set()
+        block_defs = set()
+        for inst in block.body:
+            for op in inst.operands():
+                if isinstance(op, VarOperand) and op.variable.name not in block_defs:
+                    block_uses.add(op.variable.name)
+            lhs = getattr(inst, "lhs", None)
+            if lhs is not None:
+                block_defs.add(lhs.name)
+        uses[block.label] = block_uses
+        defs[block.label] = block_defs
+
+    live_in = {block.label: set(uses[block.label]) for block in order}
+    worklist = list(order)
+    pending = {block.label for block in order}
+    while worklist:
+        block = worklist.pop()
+        pending.discard(block.label)
+        live_out = set()
+        for succ in successors(block):
+            live_out |= live_in[succ.label]
+        new_in = uses[block.label] | (live_out - defs[block.label])
+        if new_in != live_in[block.label]:
+            live_in[block.label] = new_in
+            for pred in preds[block.label]:
+                if pred.label not in pending:
+                    pending.add(pred.label)
+                    worklist.append(pred)
+    return live_in
+
+
+def _split_edge(func: Function, pred: BasicBlock, succ: BasicBlock) -> BasicBlock:
+    label = f"{pred.label}.{succ.label}"
+    while label in func.basic_blocks:
+        label += ".split"
+    jump = JumpInst(succ.label)
+    new_block = BasicBlock(label, [jump])
+    new_block.parent_function = func
+    func.basic_blocks[label] = new_block
+    new_block.resolve_labels()
+
+    terminal = pred.terminal
+    if isinstance(terminal, BranchInst):
+        if terminal.label_true == succ.label:
+            terminal.label_true = label
+        if terminal.label_false == succ.label:
+            terminal.label_false = label
+    elif isinstance(terminal, JumpInst):
+        terminal.label = label
+    pred.resolve_labels()
+    return new_block
+
+
+def _sequentialize(func: Function, copies: List[Tuple[Variable, Operand]]) -> List[CopyInst]:
+    # phis in a block are evaluated in parallel: if one reads a variable
+    # another writes, go through temporaries
+    targets = {lhs.name for lhs, _ in copies}
+    conflict = any(isinstance(op, VarOperand) and op.variable.name in targets for _, op in copies)
+    if not conflict:
+        return [CopyInst(Variable(lhs.name, lhs.type), op) for lhs, op in copies]
+    insts = []
+    temps = []
+    for lhs, op in copies:
+        temp = Variable(f"{lhs.name}.tmp", lhs.type)
+        insts.append(CopyInst(temp, op))
+        temps.append(temp)
+    for (lhs, _), temp in zip(copies, temps):
+        insts.append(CopyInst(Variable(lhs.name, lhs.type), VarOperand(temp)))
+    return insts
@@ -0,0 +1,110 @@
+from src.parser import Parser
+from src.ir import ArithInst, PhiInst, GepInst
+from src import columnar as columnar_module
+from src.columnar import ColumnarFunction, OPCODES
+from src.ssa import construct_ssa
+
+
+TEXT = """
+struct foo {
+  a: int
+}
+
+function main(n:int) -> int {
+entry:
+  i:int = $copy 0
+  p:foo* = $alloc
+  f:int* = $gep p:foo* 0 a
+  $store f:int* 7
+  fp:int[int]* = $copy @main:int[int]*
+  $jump head
+head:
+  c:int = $cmp lt i:int n:int
+  $branch c:int body exit
+body:
+  i:int = $arith add i:int 1
+  r:int = $icall fp:int[int]*(i:int)
+  s:int = $call main(r:int, @nullptr:int*)
+  $jump head
+exit:
+  v:int = $load f:int*
+  $ret v:int
+}
+"""
+
+
+def test_round_trip():
+    program = Parser(TEXT).parse_program()
+    func = program.get_function("main")
+    columnar = ColumnarFunction.from_function(func)
+    assert len(columnar) == sum(len(b.body) for b in func.basic_blocks.values())
+    assert OPCODES[columnar.opcode[columnar.block_start[2]]] is ArithInst
+    assert columnar.program_point(columnar.block_start[2] + 1) == "main.body.1"
+    back = columnar.to_function()
+    assert back.output() == func.output()
+    assert func.address_taken and back.address_taken
+
+    # what parsing resolved, and no objects shared with the original
+    gep, back_gep = func.basic_blocks["entry"].body[2], back.basic_blocks["entry"].body[2]
+    assert isinstance(back_gep, GepInst)
+    assert back_gep.field_index == gep.field_index == 0
+    assert back_gep.struct is gep.struct
+    assert str(back_gep.field_type) == "int"
+    insts = [inst for block in func.basic_blocks.values() for inst in block.body]
+    back_insts = [inst for block in back.basic_blocks.values() for inst in block.body]
+    originals = {id(op) for inst in insts for op in inst.operands()}
+    assert not any(id(op) in originals for inst in back_insts for op in inst.operands())
+
+
+def test_round_trip_ssa():
+    program = Parser(TEXT).parse_program()
+    func = program.get_function("main")
+    construct_ssa(func)
+    back = ColumnarFunction.from_function(func).to_function()
+    assert back.output() == func.output()
+    phi = back.basic_blocks["head"].body[0]
+    assert isinstance(phi, PhiInst)
+    assert [b.label for b in phi.incoming] == [b.label for b in func.basic_blocks["head"].body[0].incoming]
+    assert phi.incoming[0] is back.basic_blocks[phi.incoming[0].label]
+
+
+def test_passes():
+    program = Parser(TEXT).parse_program()
+    columnar = ColumnarFunction.from_function(program.get_function("main"))
+    defs, uses = columnar.def_use_counts()
+    i = columnar.variable_ids["i"]
+    assert defs[i] == 2
+    assert uses[i] == 3
+    assert defs[columnar.variable_ids["n"]] == 0
+
+    rows = [columnar.program_point(row) for row in columnar.constant_operand_rows()]
+    assert rows == ["main.entry.0", "main.entry.2", "main.entry.3", "main.entry.4",
+                    "main.body.0", "main.body.2"]
+    assert [columnar.program_point(row) for row in columnar.rows_with_opcode(ArithInst)] == ["main.body.0"]
+
+
+def test_passes_without_numpy():
+    # the pure Python versions give the same answers as the NumPy ones
+    program = Parser(TEXT).parse_program()
+    columnar = ColumnarFunction.from_function(program.get_function("main"))
+    results = []
+    numpy = columnar_module.numpy
+    try:
+        for module in [numpy, None]:
+            columnar_module.numpy = module
+            results.append((columnar.def_use_counts(), columnar.constant_operand_rows(),
+                            columnar.rows_with_opcode(GepInst)))
+    finally:
+        columnar_module.numpy = numpy
+    assert results[0] == results[1]
+    if numpy is not None:
+        columns = columnar.as_numpy()
+        assert columns["opcode"].tolist() == list(columnar.opcode)
+        assert columns["operands"].tolist() == list(columnar.operands)
+
+
+if __name__ == "__main__":
+    test_round_trip()
+    test_round_trip_ssa()
+    test_passes()
+    test_passes_without_numpy()
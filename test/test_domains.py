@@ -0,0 +1,87 @@
+import itertools
+
+from src.parser import Parser
+from src.ir import Aop, Rop
+from src.domains import SignDomain, ConstantDomain, IntervalDomain, BlockTransfer
+from src.constprop import RELATIONS as CMP, c_div
+
+
+ARITH = {Aop.ADD: lambda a, b: a + b, Aop.SUB: lambda a, b: a - b, Aop.MUL: lambda a, b: a * b, Aop.DIV: c_div}
+
+
+def check_sound(domain):
+    values = list(range(-7, 8)) + [-40, 40]
+    for a, b in itertools.product(values, values):
+        x, y = domain.abstract(a), domain.abstract(b)
+        for aop, f in ARITH.items():
+            if aop == Aop.DIV and b == 0:
+                continue
+            result = domain.arith[aop][x * domain.size + y]
+            assert domain.leq[domain.abstract(f(a, b)) * domain.size + result], (domain, aop, a, b)
+        for rop, f in CMP.items():
+            result = domain.cmp[rop][x * domain.size + y]
+            assert domain.leq[domain.abstract(int(f(a, b))) * domain.size + result], (domain, rop, a, b)
+        # joins are upper bounds
+        joined = domain.join[x * domain.size + y]
+        assert domain.leq[x * domain.size + joined] and domain.leq[y * domain.size + joined]
+
+
+def test_sound():
+    for domain in [SignDomain(), ConstantDomain(window=4), IntervalDomain(bound=3)]:
+        check_sound(domain)
+
+
+def test_tables():
+    sign = SignDomain()
+    pos, neg, zero = sign.POS, sign.NEG, sign.ZERO
+    assert sign.arith[Aop.MUL][neg * sign.size + neg] == pos
+    assert sign.arith[Aop.ADD][pos * sign.size + neg] == sign.top
+    assert sign.arith[Aop.DIV][pos * sign.size + zero] == sign.bottom
+    assert sign.cmp[Rop.LT][neg * sign.size + pos] == pos
+
+    constants = ConstantDomain(window=8)
+    three, four = constants.abstract(3), constants.abstract(4)
+    assert constants.decode(constants.arith[Aop.MUL][three * constants.size + four]) == constants.TOP
+    assert constants.decode(constants.arith[Aop.ADD][three * constants.size + four]) == 7
+
+    intervals = IntervalDomain(bound=4)
+    x = intervals.index[(0, 2)]
+    y = intervals.index[(3, 4)]
+    assert intervals.decode(intervals.arith[Aop.ADD][x * intervals.size + y]) == (3, float("inf"))
+    assert intervals.decode(intervals.cmp[Rop.LT][x * intervals.size + y]) == (1, 1)
+
+
+def test_block_transfer():
+    program = Parser("""
+function f(p:int) -> int {
+entry:
+  a:int = $arith mul p:int p:int
+  b:int = $arith sub 0 a:int
+  c:int = $cmp lt b:int 1
+  d:int = $copy c:int
+  e:int = $call f(d:int)
+  s:int = $select c:int a:int 5
+  $ret e:int
+}
+""").parse_program()
+    block = program.get_function("f").entry
+    sign = SignDomain()
+    transfer = BlockTransfer(sign, block)
+    state = transfer.apply({"p": sign.NEG})
+    assert state["a"] == sign.POS
+    assert state["b"] == sign.NEG
+    assert state["c"] == sign.POS
+    assert state["d"] == sign.POS
+    assert state["e"] == sign.top
+    assert state["s"] == sign.POS
+    assert set(state) == {"p", "a", "b", "c", "d", "e", "s"}
+
+    intervals = IntervalDomain()
+    state = BlockTransfer(intervals, block).apply({"p": intervals.index[(1, 2)]})
+    assert intervals.decode(state["b"]) == (-4, -1)
+
+
+if __name__ == "__main__":
+    test_sound()
+    test_tables()
+    test_block_transfer()
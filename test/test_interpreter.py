@@ -0,0 +1,157 @@
+from src.parser import Parser
+from src.interpreter import Interpreter, InterpreterError
+from src.ssa import construct_ssa
+
+
+TEXT = """
+struct node {
+  val: int
+  next: node*
+}
+
+function fib(n:int) -> int {
+entry:
+  c:int = $cmp lt n:int 2
+  $branch c:int base rec
+base:
+  $ret n:int
+rec:
+  a:int = $arith sub n:int 1
+  b:int = $arith sub n:int 2
+  x:int = $call fib(a:int)
+  y:int = $call fib(b:int)
+  r:int = $arith add x:int y:int
+  $ret r:int
+}
+
+function main(n:int) -> int {
+entry:
+  i:int = $copy 0
+  s:int = $copy 0
+  $jump head
+head:
+  c:int = $cmp lt i:int n:int
+  $branch c:int body exit
+body:
+  t:int = $arith mul i:int 3
+  s:int = $arith add s:int t:int
+  i:int = $arith add i:int 1
+  $jump head
+exit:
+  p:node* = $alloc
+  f:int* = $gep p:node* 0 val
+  $store f:int* s:int
+  q:node** = $gep p:node* 0 next
+  $store q:node** p:node*
+  p2:node* = $load q:node**
+  f2:int* = $gep p2:node* 0 val
+  v:int = $load f2:int*
+  fp:int[int]* = $copy @fib:int[int]*
+  w:int = $icall fp:int[int]*(10)
+  z:int = $arith add v:int w:int
+  $ret z:int
+}
+
+function divide(a:int, b:int) -> int {
+entry:
+  r:int = $arith div a:int b:int
+  $ret r:int
+}
+
+function deref_null() -> int {
+entry:
+  v:int = $load @nullptr:int*
+  $ret v:int
+}
+
+function io() -> int {
+entry:
+  x:int = $call input()
+  y:int = $arith mul x:int 2
+  $ret y:int
+}
+"""
+
+
+def test_run():
+    program = Parser(TEXT).parse_program()
+    interpreter = Interpreter(program, externals={"input": lambda: 21})
+    assert interpreter.run("fib", 10) == 55
+    assert interpreter.run("main", 10) == 135 + 55
+    assert interpreter.run("divide", -7, 2) == -3
+    assert interpreter.run("io") == 42
+
+
+def test_ssa_phis():
+    program = Parser(TEXT).parse_program()
+    for func in program.functions:
+        construct_ssa(func)
+    interpreter = Interpreter(program, externals={"input": lambda: 21})
+    assert interpreter.run("main", 10) == 135 + 55
+
+
+def test_errors():
+    program = Parser(TEXT).parse_program()
+    interpreter = Interpreter(program, externals={"input": lambda: 21}, max_steps=1000)
+    for func_name, args in [("divide", (1, 0)), ("deref_null", ()), ("main", (1000,)), ("fib", ())]:
+        try:
+            interpreter.run(func_name, *args)
+        except InterpreterError:
+            continue
+        assert False, func_name
+
+    interpreter = Interpreter(program)
+    assert interpreter.run("fib", 5) == 5
+    try:
+        interpreter.run("io")  # input() isn't defined
+    except InterpreterError:
+        pass
+    else:
+        assert False
+
+
+ADDROF = """
+function same(n:int) -> int {
+entry:
+  x:int = $copy 1
+  p:int* = $addrof x:int
+  q:int* = $addrof x:int
+  $store q:int* n:int
+  c:int = $cmp eq p:int* q:int*
+  v:int = $load p:int*
+  r:int = $arith add c:int v:int
+  $ret r:int
+}
+
+function outer() -> int {
+entry:
+  x:int = $copy 0
+  p:int* = $addrof x:int
+  r:int = $call inner(p:int*)
+  $ret r:int
+}
+
+function inner(o:int*) -> int {
+entry:
+  x:int = $copy 0
+  p:int* = $addrof x:int
+  c:int = $cmp eq p:int* o:int*
+  $ret c:int
+}
+"""
+
+
+def test_addrof_identity():
+    program = Parser(ADDROF).parse_program()
+    interpreter = Interpreter(program)
+    # &x twice in a frame is the same pointer
+    assert interpreter.run("same", 5) == 1 + 5
+    # but another frame's x is another variable
+    assert interpreter.run("outer") == 0
+
+
+if __name__ == "__main__":
+    test_run()
+    test_ssa_phis()
+    test_errors()
+    test_addrof_identity()
@@ -0,0 +1,99 @@
+from src.parser import Parser
+from src.ir import GepInst, Function, LazyFunction
+
+
+TEXT = """
+struct foo {
+  a: int
+  b: foo*
+}
+
+function main() -> int {
+entry:
+  p:foo* = $alloc
+  q:foo** = $gep p:foo* 0 b
+  r:int* = $gep p:foo* 0 a
+  s:foo* = $gep p:foo* 1
+  $ret 0
+}
+"""
+
+
+def test_struct_table():
+    program = Parser(TEXT).parse_program()
+    foo = program.get_struct("foo")
+    assert foo is program.structs[0]
+    assert program.get_struct("bar") is None
+    assert foo.get_field("b") is foo.fields[1]
+    assert foo.get_field("c") is None
+
+    index, type_ = program.get_field("foo", "b")
+    assert index == 1
+    assert str(type_) == "foo*"
+    assert program.get_field("foo", "c") is None
+
+
+def test_gep_field_resolution():
+    program = Parser(TEXT).parse_program()
+    gep_b = program.get_inst("main.entry.1")
+    assert isinstance(gep_b, GepInst)
+    assert gep_b.struct is program.get_struct("foo")
+    assert gep_b.field_index == 1
+    assert str(gep_b.field_type) == "foo*"
+
+    gep_a = program.get_inst("main.entry.2")
+    assert gep_a.field_index == 0
+    assert str(gep_a.field_type) == "int"
+
+    # array-style gep, no field
+    gep_none = program.get_inst("main.entry.3")
+    assert gep_none.field_index is None
+    assert gep_none.field_type is None
+
+
+LAZY_TEXT = """
+struct foo {
+  a: int
+  b: foo*
+}
+
+function helper(p:foo*) -> int {
+entry:
+  q:foo** = $gep p:foo* 0 b
+  $ret 0
+}
+
+function main() -> int {
+entry:
+  f:int[foo*]* = $copy @helper:int[foo*]*
+  n:foo* = $copy @nullptr:foo*
+  $ret 0
+}
+"""
+
+
+def test_lazy_parsing():
+    eager = Parser(LAZY_TEXT).parse_program()
+    program = Parser(LAZY_TEXT, lazy=True).parse_program()
+    helper, main = program.functions
+    assert isinstance(helper, LazyFunction)
+    assert isinstance(main, LazyFunction)
+    assert str(helper.type) == "int[foo*]"
+    # found without parsing main's body
+    assert helper.address_taken
+    assert not main.address_taken
+
+    gep = program.get_inst("helper.entry.0")
+    assert type(helper) is Function
+    assert isinstance(main, LazyFunction)
+    assert gep.field_index == 1
+    assert helper.exit is helper.entry
+
+    assert program.output() == eager.output()
+    assert type(main) is Function
+
+
+if __name__ == "__main__":
+    test_struct_table()
+    test_gep_field_resolution()
+    test_lazy_parsing()
@@ -0,0 +1,119 @@
+from src.parser import Parser
+from src.pointsto import DemandPointsTo
+
+
+TEXT = """
+struct node {
+  val: int
+  next: node*
+}
+
+function id(p:node*) -> node* {
+entry:
+  $ret p:node*
+}
+
+function main() -> int {
+entry:
+  a:node* = $alloc
+  b:node* = $alloc
+  c:node* = $call id(a:node*)
+  f:node*[node*]* = $copy @id:node*[node*]*
+  d:node* = $icall f:node*[node*]*(b:node*)
+  slot:node** = $alloc
+  $store slot:node** d:node*
+  e:node* = $load slot:node**
+  n:node** = $gep e:node* 0 next
+  x:int = $copy 0
+  px:int* = $addrof x:int
+  $ret 0
+}
+
+function unrelated() -> int {
+entry:
+  u:node* = $alloc
+  v:node* = $copy u:node*
+  $ret 0
+}
+"""
+
+
+def test_points_to():
+    program = Parser(TEXT).parse_program()
+    demand = DemandPointsTo(program)
+    a, b, slot = "main.entry.0", "main.entry.1", "main.entry.5"
+    assert demand.points_to("main", "a").objects == {a}
+    assert demand.points_to("main", "f").objects == {"@id"}
+    # through the call
+    assert demand.points_to("main", "c").objects == {a, b}
+    assert demand.points_to("id", "p").objects == {a, b}
+    # through memory
+    assert demand.points_to("main", "e").objects == {a, b}
+    assert demand.points_to("main", "n").objects == {a, b}
+    assert demand.points_to("main", "slot").objects == {slot}
+    assert demand.points_to("main", "px").objects == {"&main.x"}
+    assert demand.may_alias("main", "c", "main", "e")
+    assert not demand.may_alias("main", "a", "main", "slot")
+
+    load = program.get_inst("main.entry.7")
+    assert demand.points_to_operand(load, load.src_ptr).objects == {slot}
+
+    # only what the queries needed was looked at
+    assert ("unrelated", "v") not in demand.demanded
+
+
+def test_budget():
+    program = Parser(TEXT).parse_program()
+    demand = DemandPointsTo(program, budget=3)
+    result = demand.points_to("main", "e")
+    assert not result.complete
+    assert "main.entry.0" in result.objects
+    # picks up where it stopped
+    demand.budget = None
+    result = demand.points_to("main", "e")
+    assert result.complete
+    assert result.objects == {"main.entry.0", "main.entry.1"}
+
+
+ADDRESS_TAKEN = """
+function main() -> int {
+entry:
+  o:int* = $alloc
+  x:int* = $copy @nullptr:int*
+  p:int** = $addrof x:int*
+  $store p:int** o:int*
+  y:int* = $copy x:int*
+  q:int** = $alloc
+  $store q:int** y:int*
+  z:int* = $load q:int**
+  $ret 0
+}
+
+function unrelated() -> int {
+entry:
+  u:int** = $alloc
+  v:int* = $alloc
+  $store u:int** v:int*
+  w:int* = $load u:int**
+  $ret 0
+}
+"""
+
+
+def test_address_taken():
+    program = Parser(ADDRESS_TAKEN).parse_program()
+    demand = DemandPointsTo(program)
+    o = "main.entry.0"
+    # stored through &x
+    assert demand.points_to("main", "x").objects == {o}
+    assert demand.points_to("main", "y").objects == {o}
+    assert demand.points_to("main", "z").objects == {o}
+    # the load in main never looks at the stores in unrelated()
+    assert not any(node[0] == "unrelated" for node in demand.demanded)
+    assert demand.points_to("unrelated", "w").objects == {"unrelated.entry.1"}
+
+
+if __name__ == "__main__":
+    test_points_to()
+    test_budget()
+    test_address_taken()
@@ -0,0 +1,77 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from src import ir
+from src.parser import Parser
+from src.profiling import profile, active_profile
+from src.set_constraints import SetConstraints
+
+
+TEXT = """
+function main() -> int {
+entry:
+  x:int = $copy 1
+  $jump exit
+exit:
+  $ret x:int
+}
+"""
+
+
+def test_profile():
+    with profile() as prof:
+        assert active_profile() is prof
+        program = Parser(TEXT).parse_program()
+        program.get_inst("main.exit.0")
+        SetConstraints.parse("def constructor c, arity 0, contravariant positions\ncall(c) <= x\n")
+        with prof.phase("my analysis"):
+            pass
+
+    result = json.loads(prof.to_json())
+    assert result["timers"]["Parser.parse_program"]["calls"] == 1
+    assert result["timers"]["BasicBlock.resolve_labels"]["calls"] == 2
+    assert result["timers"]["Program.get_inst"]["calls"] == 1
+    assert result["timers"]["SetConstraints.parse"]["calls"] == 1
+    assert result["timers"]["my analysis"]["calls"] == 1
+    assert result["counters"]["tokens consumed"] > 0
+    assert result["counters"]["regex matches"] >= result["counters"]["tokens consumed"]
+    assert result["allocations"]["BasicBlock"] == 2
+    assert result["allocations"]["CopyInst"] == 1
+    assert result["allocations"]["Constructor"] == 1
+    assert result["peak_memory"] > 0
+
+
+def test_disabled():
+    get_inst = vars(ir.Program)["get_inst"]
+    init = vars(ir.BasicBlock)["__init__"]
+    with profile(trace_memory=False) as prof:
+        assert vars(ir.Program)["get_inst"] is not get_inst
+    # everything is put back, so there is nothing left to slow things down
+    assert vars(ir.Program)["get_inst"] is get_inst
+    assert vars(ir.BasicBlock)["__init__"] is init
+    assert active_profile() is None
+    assert prof.peak_memory is None
+
+    Parser(TEXT).parse_program()
+    assert "BasicBlock" not in prof.allocations
+
+
+def test_command_line_json():
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "a.ir"), "w") as f:
+            f.write(TEXT)
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable, "-m", "src.parser", os.path.join(tmp, "*.ir"), "--profile"],
+                                cwd=root, capture_output=True, text=True, check=True)
+    # stdout is only the profile, the progress goes to stderr
+    assert "Parser.parse_program" in json.loads(result.stdout)["timers"]
+    assert "without errors" in result.stderr
+
+
+if __name__ == "__main__":
+    test_profile()
+    test_disabled()
+    test_command_line_json()
@@ -0,0 +1,149 @@
+import os
+import tempfile
+
+from src.parser import Parser
+from src.domains import SignDomain, BlockTransfer
+from src.results import ResultStore, ResultStoreBuilder
+
+
+TEXT = """
+function f(p:int) -> int {
+entry:
+  x:int = $copy 1
+  y:int = $arith sub x:int 3
+  $branch p:int then else
+then:
+  z:int = $arith mul y:int y:int
+  $jump else
+else:
+  $ret x:int
+}
+
+function main() -> int {
+entry:
+  r:int = $call f(2)
+  $ret r:int
+}
+"""
+
+
+def build(path):
+    program = Parser(TEXT).parse_program()
+    domain = SignDomain()
+    signs = {}
+    defines = {}
+    reaching = {}
+    for func in program.functions:
+        seen = []
+        for block in func.basic_blocks.values():
+            out = BlockTransfer(domain, block).apply({})
+            for inst in block.body:
+                lhs = getattr(inst, "lhs", None)
+                if lhs is not None:
+                    signs[inst.program_point] = out[lhs.name]
+                    defines[inst.program_point] = [lhs.name]
+                # not a real reaching definitions analysis, just something point-shaped
+                reaching[inst.program_point] = list(seen)
+                seen.append(inst.program_point)
+    builder = ResultStoreBuilder.for_program(program)
+    builder.add_int_column("sign", signs, typecode="b", default=-1)
+    builder.add_bitset_column("defines", defines, universe=["p", "r", "x", "y", "z"])
+    builder.add_bitset_column("reaching", reaching)
+    builder.write(path)
+    return program, signs, defines, reaching
+
+
+def test_roundtrip():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "results.bin")
+        program, signs, defines, reaching = build(path)
+        with ResultStore(path) as store:
+            assert len(store) == 8
+            assert sorted(store.columns) == ["defines", "reaching", "sign"]
+            assert store.get("sign", "f.entry.0") == SignDomain.POS
+            # pos - pos is any sign
+            assert store.get("sign", "f.entry.1") == SignDomain().top
+            assert store.get("sign", "f.entry.2") == -1
+            assert store.get("defines", "f.then.0") == {"z"}
+            assert store.get("defines", "f.else.0") == set()
+            for point in reaching:
+                assert store.get("reaching", point) == set(reaching[point])
+                assert store.point(store.point_id(point)) == point
+                inst = program.get_inst(point)
+                assert store.facts(inst.program_point)["sign"] == signs.get(point, -1)
+            assert store.bits("reaching", "f.entry.2") == \
+                (1 << store.point_id("f.entry.0")) | (1 << store.point_id("f.entry.1"))
+            column = store.int_column("sign")
+            assert list(column) == [signs.get(store.point(i), -1) for i in range(len(store))]
+
+
+def test_errors():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "results.bin")
+        build(path)
+        with ResultStore(path) as store:
+            for bad in ["f.entry.9", "", "zzz"]:
+                try:
+                    store.get("sign", bad)
+                except ValueError:
+                    pass
+                else:
+                    assert False
+            try:
+                store.get("liveness", "f.entry.0")
+            except ValueError:
+                pass
+            else:
+                assert False
+        with open(path, "wb") as f:
+            f.write(b"not results")
+        try:
+            ResultStore(path)
+        except ValueError:
+            pass
+        else:
+            assert False
+    builder = ResultStoreBuilder(["f.entry.0"])
+    try:
+        builder.add_int_column("sign", {"f.entry.1": 1})
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+
+def test_truncated():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "results.bin")
+        build(path)
+        with open(path, "rb") as f:
+            data = f.read()
+        cut_path = os.path.join(tmp, "cut.bin")
+        for size in range(len(data)):
+            with open(cut_path, "wb") as f:
+                f.write(data[:size])
+            try:
+                ResultStore(cut_path).close()
+            except ValueError:
+                continue
+            # only the padding after the last column can go
+            assert size >= len(data) - 7
+
+
+def test_empty():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "results.bin")
+        builder = ResultStoreBuilder([])
+        builder.add_int_column("sign", {})
+        builder.write(path)
+        with ResultStore(path) as store:
+            assert len(store) == 0
+            assert list(store.int_column("sign")) == []
+
+
+if __name__ == "__main__":
+    test_roundtrip()
+    test_errors()
+    test_truncated()
+    test_empty()
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+
+from src.server import AnalysisServer, Client
+
+
+IR_TEXT = """
+function main() -> int {
+entry:
+  x:int = $copy 1
+  $ret x:int
+}
+"""
+
+CONSTRAINTS_TEXT = """
+def constructor c, arity 0, contravariant positions
+call(c) <= x
+x <= y
+"""
+
+
+def test_handle():
+    with tempfile.TemporaryDirectory() as tmp:
+        ir_path = os.path.join(tmp, "a.ir")
+        with open(ir_path, "w") as f:
+            f.write(IR_TEXT)
+        server = AnalysisServer()
+
+        response = server.handle({"id": 3, "method": "get_inst", "path": ir_path, "program_point": "main.entry.0"})
+        assert response == {"id": 3, "result": "x:int = $copy 1"}
+        response = server.handle({"id": 4, "method": "get_inst", "path": ir_path, "program_point": "main.entry.5"})
+        assert "error" in response
+        assert "error" in server.handle({"method": "nope", "path": ir_path})
+
+        functions = server.handle({"method": "functions", "path": ir_path})["result"]
+        assert functions == [{"name": "main", "type": "int[]", "parameters": [], "address_taken": False}]
+        assert len(server.programs) == 1
+        assert server.programs.misses == 1
+
+
+def test_socket():
+    with tempfile.TemporaryDirectory() as tmp:
+        ir_path = os.path.join(tmp, "a.ir")
+        with open(ir_path, "w") as f:
+            f.write(IR_TEXT)
+        constraints_path = os.path.join(tmp, "a.txt")
+        with open(constraints_path, "w") as f:
+            f.write(CONSTRAINTS_TEXT)
+        socket_path = os.path.join(tmp, "server.sock")
+
+        server = AnalysisServer()
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+        stop = asyncio.Event()
+
+        async def run():
+            unix_server = await asyncio.start_unix_server(server.serve_client, path=socket_path)
+            started.set()
+            async with unix_server:
+                await stop.wait()
+
+        thread = threading.Thread(target=loop.run_until_complete, args=(run(),))
+        thread.start()
+        started.wait(5)
+
+        with Client(socket_path) as a, Client(socket_path) as b:
+            assert a.request("output", path=ir_path) == b.request("output", path=ir_path)
+            responses = b.batch([
+                {"id": 1, "method": "get_inst", "path": ir_path, "program_point": "main.entry.1"},
+                {"id": 2, "method": "set_constraints", "path": constraints_path},
+            ])
+            assert responses[0] == {"id": 1, "result": "$ret x:int"}
+            assert responses[1]["result"].splitlines()[1:] == ["call(c) <= x", "x <= y"]
+            stats = a.request("stats")
+            # both clients share the one parsed program
+            assert stats["programs"]["size"] == 1
+            assert stats["results"]["hits"] >= 1
+
+        loop.call_soon_threadsafe(stop.set)
+        thread.join(5)
+        loop.close()
+
+
+def test_malformed_requests():
+    server = AnalysisServer()
+    for line in ["5", '"x"', "null", "[1]", "[{}, 2]", "not json"]:
+        responses = json.loads(server.handle_line(line))
+        if not isinstance(responses, list):
+            responses = [responses]
+        assert all("error" in response and response["id"] is None for response in responses)
+    assert json.loads(server.handle_line("[1]")) == [{"id": None, "error": "Request must be an object, not 1"}]
+
+
+if __name__ == "__main__":
+    test_handle()
+    test_socket()
+    test_malformed_requests()
@@ -0,0 +1,93 @@
+import io
+
+from src.set_constraints import SetConstraints
+from bench.gen_set_constraints import generate
+
+
+TEXT = """
+def constructor c1, arity 1, contravariant positions
+def constructor c2, arity 0, contravariant positions
+def constructor c3, arity 2, contravariant positions 1
+call(c1, A) <= X
+X <= Y
+proj(c1, Y, 0) <= Z
+call(c2) <= A
+call(c3, call(c1, P), Q) <= R
+R <= call(c3, S, call(c1, call(c2)))
+X <= Y
+"""
+
+
+def old_to_text(set_constraints):
+    s = ""
+    s += "\n".join(sorted(c.as_def() for c in set_constraints.constructors)) + "\n"
+    s += "\n".join(sorted(set(str(c) for c in set_constraints.constraints))) + "\n"
+    return s
+
+
+def test_write_text():
+    for text in [TEXT, generate(500, max_depth=3, proj_density=0.2), ""]:
+        set_constraints = SetConstraints.parse(text)
+        out = io.StringIO()
+        set_constraints.write_text(out, batch_size=7)
+        assert out.getvalue() == old_to_text(set_constraints)
+        assert set_constraints.to_text() == out.getvalue()
+
+
+def test_binary_roundtrip():
+    for text in [TEXT, generate(500, max_depth=3, proj_density=0.2), ""]:
+        set_constraints = SetConstraints.parse(text)
+        out = io.BytesIO()
+        set_constraints.write_binary(out)
+        read = SetConstraints.read_binary(io.BytesIO(out.getvalue()))
+        assert read.to_text() == set_constraints.to_text()
+        assert [str(c) for c in read.constraints] == [str(c) for c in set_constraints.constraints]
+        assert [v.name for v in read.set_variables] == [v.name for v in set_constraints.set_variables]
+        assert [c.contravariant_positions for c in read.constructors] == \
+            [c.contravariant_positions for c in set_constraints.constructors]
+
+
+def test_binary_duplicate_constructor():
+    set_constraints = SetConstraints.parse("""
+def constructor a, arity 1, contravariant positions
+def constructor a, arity 1, contravariant positions 0
+def constructor b, arity 1, contravariant positions
+call(b, x) <= y
+call(a, x) <= proj(b, y, 0)
+""")
+    out = io.BytesIO()
+    set_constraints.write_binary(out)
+    read = SetConstraints.read_binary(io.BytesIO(out.getvalue()))
+    assert [str(c) for c in read.constraints] == ["call(b, x) <= y", "call(a, x) <= proj(b, y, 0)"]
+    assert read.constraints[0].left.constructor is read.constructors[2]
+    assert read.constraints[1].left.constructor is read.constructors[0]
+    assert read.to_text() == set_constraints.to_text()
+
+
+def test_binary_solves_the_same():
+    set_constraints = SetConstraints.parse(TEXT)
+    out = io.BytesIO()
+    set_constraints.write_binary(out)
+    read = SetConstraints.read_binary(io.BytesIO(out.getvalue()))
+    set_constraints.solve()
+    read.solve()
+    for var in "XYZAR":
+        assert sorted(map(str, read.solution(var))) == sorted(map(str, set_constraints.solution(var)))
+    assert len(read.errors) == len(set_constraints.errors)
+
+
+def test_binary_bad_magic():
+    try:
+        SetConstraints.read_binary(io.BytesIO(b"def constructor"))
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+if __name__ == "__main__":
+    test_write_text()
+    test_binary_roundtrip()
+    test_binary_duplicate_constructor()
+    test_binary_solves_the_same()
+    test_binary_bad_magic()
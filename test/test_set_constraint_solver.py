@@ -0,0 +1,119 @@
+from src.set_constraints import SetConstraints
+
+
+TEXT = """
+def constructor c1, arity 1, contravariant positions
+def constructor c2, arity 0, contravariant positions
+def constructor c3, arity 2, contravariant positions 1
+call(c1, A) <= X
+X <= Y
+proj(c1, Y, 0) <= Z
+call(c2) <= A
+call(c3, P, Q) <= R
+R <= call(c3, S, T)
+"""
+
+
+def names(calls):
+    return sorted(str(c) for c in calls)
+
+
+def test_solve():
+    set_constraints = SetConstraints.parse(TEXT)
+    set_constraints.solve()
+    assert names(set_constraints.solution("Y")) == ["call(c1, A)"]
+    assert names(set_constraints.solution("A")) == ["call(c2)"]
+    # through the projection
+    assert names(set_constraints.solution("Z")) == ["call(c2)"]
+    # covariant and contravariant arguments
+    assert set_constraints.get_set_variable("S") in set_constraints.get_set_variable("P").successors
+    assert set_constraints.get_set_variable("Q") in set_constraints.get_set_variable("T").successors
+    assert set_constraints.errors == []
+
+
+def test_incremental():
+    set_constraints = SetConstraints.parse(TEXT)
+    set_constraints.solve()
+    set_constraints.add_parsed_constraint("Y <= W")
+    assert names(set_constraints.solution("W")) == ["call(c1, A)"]
+
+    # a cycle
+    set_constraints.add_parsed_constraint("W <= X")
+    set_constraints.add_parsed_constraint("call(c1, B) <= W")
+    assert names(set_constraints.solution("X")) == ["call(c1, A)", "call(c1, B)"]
+    set_constraints.add_parsed_constraint("call(c2) <= B")
+    assert names(set_constraints.solution("Z")) == ["call(c2)"]
+    set_constraints.add_parsed_constraint("Y <= call(c2)")
+    assert len(set_constraints.errors) == 2
+
+    # same result as solving everything at once
+    batch = SetConstraints.parse(set_constraints.to_text())
+    batch.solve()
+    for var in set_constraints.set_variables:
+        assert names(batch.solution(var.name)) == names(var.lower_bounds)
+
+
+def test_snapshot_rollback():
+    set_constraints = SetConstraints.parse(TEXT)
+    set_constraints.solve()
+    before = set_constraints.to_text()
+    snapshot = set_constraints.snapshot()
+    set_constraints.add_parsed_constraint("call(c1, New) <= X")
+    set_constraints.add_parsed_constraint("call(c2) <= New")
+    set_constraints.add_parsed_constraint("Y <= call(c2)")
+    assert names(set_constraints.solution("Z")) == ["call(c2)"]
+    assert set_constraints.errors
+
+    set_constraints.rollback(snapshot)
+    assert set_constraints.to_text() == before
+    assert set_constraints.errors == []
+    assert names(set_constraints.solution("Y")) == ["call(c1, A)"]
+    assert "New" not in [var.name for var in set_constraints.set_variables]
+    set_constraints.commit()
+    assert set_constraints.trail is None
+    try:
+        set_constraints.rollback(snapshot)
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def test_rollback_constructors_and_terms():
+    set_constraints = SetConstraints.parse(TEXT)
+    set_constraints.solve()
+    c1 = set_constraints.get_constructor("c1")
+    calls = set(c1.calls)
+    projections = set(set_constraints.get_set_variable("Y").projections)
+    for _ in range(3):
+        snapshot = set_constraints.snapshot()
+        set_constraints.add_parsed_constructor("def constructor c4, arity 1, contravariant positions")
+        set_constraints.add_parsed_constraint("call(c4, call(c1, B)) <= proj(c1, Y, 0)")
+        set_constraints.add_parsed_constraint("proj(c4, Y, 0) <= call(c1, A)")
+        set_constraints.rollback(snapshot)
+        assert set_constraints.get_constructor("c4") is None
+        assert "c4" not in [c.name for c in set_constraints.constructors]
+        assert c1.calls == calls
+        assert set_constraints.get_set_variable("Y").projections == projections
+
+
+def test_errors_deduplicated():
+    set_constraints = SetConstraints.parse(TEXT + """
+call(c2) <= B
+B <= C
+B <= D
+C <= E
+D <= E
+E <= call(c1, F)
+""")
+    set_constraints.solve()
+    # call(c2) reaches E along two paths, but is one error
+    assert sorted(map(str, set_constraints.errors)) == ["call(c2) <= call(c1, F)"]
+
+
+if __name__ == "__main__":
+    test_solve()
+    test_incremental()
+    test_snapshot_rollback()
+    test_rollback_constructors_and_terms()
+    test_errors_deduplicated()
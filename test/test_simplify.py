@@ -0,0 +1,126 @@
+from src.parser import Parser
+from src.ir import PhiInst
+from src.simplify import simplify_cfg
+from src.ssa import construct_ssa
+from src.interpreter import Interpreter
+
+
+TEXT = """
+function f(p:int) -> int {
+entry:
+  x:int = $copy 1
+  $branch 1 then never
+then:
+  $jump forward
+forward:
+  $jump join
+never:
+  x:int = $copy 2
+  $jump join
+join:
+  y:int = $arith add x:int p:int
+  $branch y:int same same
+same:
+  $ret y:int
+dead:
+  $jump dead
+}
+
+function g(p:int) -> int {
+entry:
+  x:int = $copy 0
+  $branch p:int a b
+a:
+  x:int = $copy 1
+  $jump c
+b:
+  $jump c
+c:
+  $ret x:int
+}
+"""
+
+
+def test_simplify():
+    program = Parser(TEXT).parse_program()
+    func = program.get_function("f")
+    simplification = simplify_cfg(func)
+    assert list(func.basic_blocks) == ["entry"]
+    assert [inst.output() for inst in func.entry.body] == [
+        "x:int = $copy 1",
+        "y:int = $arith add x:int p:int",
+        "$ret y:int",
+    ]
+    assert simplification.mapping["f.entry.0"] == "f.entry.0"
+    assert simplification.mapping["f.join.0"] == "f.entry.1"
+    assert simplification.mapping["f.same.0"] == "f.entry.2"
+    assert simplification.mapping["f.entry.1"] is None
+    assert simplification.mapping["f.never.0"] is None
+    assert simplification.mapping["f.dead.0"] is None
+    assert simplification.origins["f.entry.1"] == ["f.join.0"]
+    # every original point is accounted for
+    assert len(simplification.mapping) == 10
+
+    Parser(program.output()).parse_program()
+
+
+def test_simplify_ssa():
+    program = Parser(TEXT).parse_program()
+    func = program.get_function("g")
+    construct_ssa(func)
+    simplify_cfg(func)
+    # b can't be threaded away: c's phi needs to know which way it came
+    assert sorted(func.basic_blocks) == ["a", "b", "c", "entry"]
+    phi = func.basic_blocks["c"].body[0]
+    assert isinstance(phi, PhiInst)
+
+    # still computes the same thing
+    interpreter = Interpreter(program)
+    assert interpreter.run("g", 0) == 0
+    assert interpreter.run("g", 5) == 1
+
+
+def test_thread_into_branch():
+    program = Parser("""
+function h(p:int) -> int {
+entry:
+  $branch p:int t1 t2
+t1:
+  $jump out
+t2:
+  $jump out
+out:
+  $ret p:int
+}
+""").parse_program()
+    func = program.get_function("h")
+    simplify_cfg(func)
+    # both sides thread to out, the branch folds and out is merged in
+    assert list(func.basic_blocks) == ["entry"]
+    assert func.exit is func.entry
+
+
+
+def test_exit_removed():
+    program = Parser("""
+function f() -> int {
+entry:
+  $jump loop
+loop:
+  $jump loop
+dead:
+  $ret 0
+}
+""").parse_program()
+    func = program.get_function("f")
+    assert func.exit is func.basic_blocks["dead"]
+    simplify_cfg(func)
+    assert "dead" not in func.basic_blocks
+    assert func.exit is None
+
+
+if __name__ == "__main__":
+    test_simplify()
+    test_simplify_ssa()
+    test_thread_into_branch()
+    test_exit_removed()
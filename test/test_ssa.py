@@ -0,0 +1,142 @@
+from src.parser import Parser
+from src.ir import PhiInst, CopyInst
+from src.ssa import construct_ssa, destruct_ssa
+from src.constprop import dense_constant_propagation, sparse_constant_propagation, BOTTOM
+from src.interpreter import Interpreter
+
+
+TEXT = """
+function f(p:int) -> int {
+entry:
+  x:int = $copy 1
+  y:int = $copy 2
+  $branch p:int left right
+left:
+  x:int = $copy 1
+  y:int = $copy 3
+  $jump join
+right:
+  t:int = $arith add x:int 0
+  $jump join
+join:
+  z:int = $arith mul x:int 5
+  $ret y:int
+}
+
+function g(n:int) -> int {
+entry:
+  i:int = $copy 0
+  $jump head
+head:
+  old:int = $copy i:int
+  i:int = $arith add i:int 1
+  c:int = $cmp lt i:int n:int
+  $branch c:int head exit
+exit:
+  $ret old:int
+}
+"""
+
+
+def test_construct_ssa():
+    program = Parser(TEXT).parse_program()
+    func = program.get_function("f")
+    versions = construct_ssa(func)
+
+    # every variable is defined exactly once
+    defined = []
+    for block in func.basic_blocks.values():
+        for inst in block.body:
+            if hasattr(inst, "lhs"):
+                defined.append(inst.lhs.name)
+    assert len(defined) == len(set(defined))
+    assert all(versions[name] in "xyzt" for name in defined)
+
+    # t is dead at join, so pruned ssa gives it no phi
+    phis = [inst for inst in func.basic_blocks["join"].body if isinstance(inst, PhiInst)]
+    assert sorted(versions[phi.lhs.name] for phi in phis) == ["x", "y"]
+    for phi in phis:
+        assert sorted(b.label for b in phi.incoming) == ["left", "right"]
+
+    # the output still parses
+    Parser(program.output()).parse_program()
+
+
+def test_constant_propagation():
+    program = Parser(TEXT).parse_program()
+    func = program.get_function("f")
+    dense = dense_constant_propagation(func)
+    assert dense["join"]["x"] == 1
+    assert dense["join"]["y"] == BOTTOM
+
+    versions = construct_ssa(func)
+    sparse = sparse_constant_propagation(func)
+    join = func.basic_blocks["join"]
+    z = join.body[-2].lhs.name
+    assert versions[z] == "z"
+    assert sparse[z] == 5
+    assert sparse["p"] == BOTTOM
+    y = join.terminal.retval.variable.name
+    assert sparse[y] == BOTTOM
+
+
+def test_destruct_ssa():
+    program = Parser(TEXT).parse_program()
+    func = program.get_function("g")
+    construct_ssa(func)
+    destruct_ssa(func)
+    for block in func.basic_blocks.values():
+        assert not any(isinstance(inst, PhiInst) for inst in block.body)
+
+    # head -> head is a critical edge, so the copies for it go in a new block
+    # and not at the end of head, where they would clobber i on the way to exit
+    head = func.basic_blocks["head"]
+    assert not any(isinstance(inst, CopyInst) and inst.lhs.name.startswith("i.")
+                   for inst in head.body[1:])
+    split = func.basic_blocks["head.head"]
+    assert split.terminal.target is head
+    assert head.terminal.target_true is split
+    Parser(program.output()).parse_program()
+
+
+ADDRESS_TAKEN = """
+function f(c:int) -> int {
+entry:
+  x:int = $copy 1
+  p:int* = $addrof x:int
+  $branch c:int left join
+left:
+  x:int = $copy 2
+  $jump join
+join:
+  $store p:int* 5
+  y:int = $copy x:int
+  $ret y:int
+}
+"""
+
+
+def test_address_taken():
+    program = Parser(ADDRESS_TAKEN).parse_program()
+    func = program.get_function("f")
+    assert Interpreter(program).run("f", 1) == 5
+    dense = dense_constant_propagation(func)
+    assert dense["join"]["x"] == BOTTOM
+
+    versions = construct_ssa(func)
+    # x lives in memory, so it is neither versioned nor merged with a phi
+    assert "x" not in versions.values()
+    assert not any(isinstance(inst, PhiInst) for inst in func.basic_blocks["join"].body)
+    assert func.basic_blocks["left"].body[0].lhs.name == "x"
+    sparse = sparse_constant_propagation(func)
+    y = func.basic_blocks["join"].terminal.retval.variable.name
+    assert versions[y] == "y"
+    assert sparse[y] == BOTTOM
+    assert Interpreter(program).run("f", 1) == 5
+
+
+if __name__ == "__main__":
+    test_construct_ssa()
+    test_constant_propagation()
+    test_destruct_ssa()
+    test_address_taken()